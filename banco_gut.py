@@ -0,0 +1,564 @@
+"""Esquema, migrações, pool de conexões e consultas SQL da Matriz GUT (usados pelo gut3.py e pelo gut2.py).
+
+Sem dependência do Streamlit: pode ser importado por scripts e pelos testes.
+"""
+
+import os
+import queue
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+# ===================== ESQUEMA E MIGRAÇÕES =====================
+# Histograma materializado: 15 contadores por problema (notas 1 a 5 em G, U e T)
+CRITERIOS_HISTOGRAMA = (("g", "gravidade"), ("u", "urgencia"), ("t", "tendencia"))
+COLUNAS_HISTOGRAMA = [f"{c}{n}" for c, _ in CRITERIOS_HISTOGRAMA for n in range(1, 6)]
+
+def _sql_ajuste_histograma(voto, sinal):
+    """Gera as atribuições SET que somam (+) ou subtraem (-) o voto `voto` dos contadores"""
+    return ", ".join(
+        f"{c}{n} = {c}{n} {sinal} ({voto}.{coluna} = {n})"
+        for c, coluna in CRITERIOS_HISTOGRAMA for n in range(1, 6)
+    )
+
+def esquema_legado(conn):
+    """True se o banco ainda usa o esquema antigo (votos com TEXT participante/problema_id md5)"""
+    colunas = [c[1] for c in conn.execute("PRAGMA table_info(votos)")]
+    return "participante" in colunas
+
+def migrar_esquema_legado(conn):
+    """Converte no próprio arquivo o esquema antigo para chaves inteiras e datas em epoch.
+    
+    problemas.id (md5) vira problemas.codigo; participantes ganham tabela própria e
+    votos passam a referenciar ambos por INTEGER. Roda dentro da transação da migração.
+    """
+    # Horários antigos eram texto local 'AAAA-MM-DD HH:MM:SS'; o modificador 'utc' converte para epoch
+    epoch = "CAST(strftime('%s', {col}, 'utc') AS INTEGER)"
+    
+    conn.execute('DROP TABLE IF EXISTS histograma_votos')
+    
+    conn.execute('''
+        CREATE TABLE problemas_novo (
+            id INTEGER PRIMARY KEY,
+            codigo TEXT NOT NULL UNIQUE,
+            nome TEXT NOT NULL,
+            descricao TEXT,
+            criado_em INTEGER NOT NULL
+        )
+    ''')
+    conn.execute(f'''
+        INSERT INTO problemas_novo (codigo, nome, descricao, criado_em)
+        SELECT id, nome, descricao, COALESCE({epoch.format(col="timestamp")}, CAST(strftime('%s', 'now') AS INTEGER))
+        FROM problemas ORDER BY timestamp
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS participantes (
+            id INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL UNIQUE
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO participantes (nome)
+        SELECT DISTINCT participante FROM votos WHERE participante IS NOT NULL
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE votos_novo (
+            problema_id INTEGER NOT NULL REFERENCES problemas_novo (id),
+            participante_id INTEGER NOT NULL REFERENCES participantes (id),
+            gravidade INTEGER NOT NULL,
+            urgencia INTEGER NOT NULL,
+            tendencia INTEGER NOT NULL,
+            criado_em INTEGER NOT NULL,
+            PRIMARY KEY (problema_id, participante_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'''
+        INSERT INTO votos_novo (problema_id, participante_id, gravidade, urgencia, tendencia, criado_em)
+        SELECT p.id, pa.id, v.gravidade, v.urgencia, v.tendencia,
+               COALESCE({epoch.format(col="v.timestamp")}, p.criado_em)
+        FROM votos v
+        JOIN problemas_novo p ON p.codigo = v.problema_id
+        JOIN participantes pa ON pa.nome = v.participante
+    ''')
+    
+    conn.execute('DROP TABLE votos')
+    conn.execute('DROP TABLE problemas')
+    conn.execute('ALTER TABLE problemas_novo RENAME TO problemas')
+    conn.execute('ALTER TABLE votos_novo RENAME TO votos')
+
+def migracao_esquema_normalizado(conn):
+    """v1: problemas, participantes e votos com chaves inteiras (converte bancos antigos)"""
+    cursor = conn.cursor()
+    
+    # Bancos de oficinas anteriores são convertidos para o esquema normalizado
+    if esquema_legado(conn):
+        migrar_esquema_legado(conn)
+    
+    # Tabela de problemas (codigo = gerar_id_problema(nome), evita duplicados)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS problemas (
+            id INTEGER PRIMARY KEY,
+            codigo TEXT NOT NULL UNIQUE,
+            nome TEXT NOT NULL,
+            descricao TEXT,
+            criado_em INTEGER NOT NULL
+        )
+    ''')
+    
+    # Tabela de participantes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS participantes (
+            id INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL UNIQUE
+        )
+    ''')
+    
+    # Tabela de votos: chave composta inteira, sem rowid separado
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS votos (
+            problema_id INTEGER NOT NULL REFERENCES problemas (id),
+            participante_id INTEGER NOT NULL REFERENCES participantes (id),
+            gravidade INTEGER NOT NULL,
+            urgencia INTEGER NOT NULL,
+            tendencia INTEGER NOT NULL,
+            criado_em INTEGER NOT NULL,
+            PRIMARY KEY (problema_id, participante_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Votos de um participante (pré-preenchimento da tela de votação)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_votos_participante ON votos (participante_id)')
+
+def migracao_histograma_votos(conn):
+    """v2: histograma de votos materializado e os triggers que o mantêm"""
+    cursor = conn.cursor()
+    
+    # Histograma de votos por problema, mantido por triggers na mesma transação do voto
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'histograma_votos'")
+    histograma_novo = cursor.fetchone() is None
+    
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS histograma_votos (
+            problema_id INTEGER PRIMARY KEY,
+            {", ".join(f"{col} INTEGER NOT NULL DEFAULT 0" for col in COLUNAS_HISTOGRAMA)}
+        )
+    ''')
+    
+    # INSERT OR REPLACE apaga a linha antiga sem disparar triggers de DELETE
+    # (recursive_triggers desligado), então o voto substituído é descontado antes do INSERT
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS histograma_votos_substituicao BEFORE INSERT ON votos
+        BEGIN
+            UPDATE histograma_votos SET {_sql_ajuste_histograma("v", "-")}
+            FROM (SELECT problema_id, gravidade, urgencia, tendencia FROM votos
+                  WHERE problema_id = NEW.problema_id AND participante_id = NEW.participante_id) AS v
+            WHERE histograma_votos.problema_id = v.problema_id;
+        END
+    ''')
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS histograma_votos_insercao AFTER INSERT ON votos
+        BEGIN
+            INSERT INTO histograma_votos (problema_id) SELECT NEW.problema_id
+            WHERE NOT EXISTS (SELECT 1 FROM histograma_votos WHERE problema_id = NEW.problema_id);
+            UPDATE histograma_votos SET {_sql_ajuste_histograma("NEW", "+")}
+            WHERE problema_id = NEW.problema_id;
+        END
+    ''')
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS histograma_votos_atualizacao
+        AFTER UPDATE OF problema_id, gravidade, urgencia, tendencia ON votos
+        BEGIN
+            UPDATE histograma_votos SET {_sql_ajuste_histograma("OLD", "-")}
+            WHERE problema_id = OLD.problema_id;
+            INSERT INTO histograma_votos (problema_id) SELECT NEW.problema_id
+            WHERE NOT EXISTS (SELECT 1 FROM histograma_votos WHERE problema_id = NEW.problema_id);
+            UPDATE histograma_votos SET {_sql_ajuste_histograma("NEW", "+")}
+            WHERE problema_id = NEW.problema_id;
+        END
+    ''')
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS histograma_votos_remocao AFTER DELETE ON votos
+        BEGIN
+            UPDATE histograma_votos SET {_sql_ajuste_histograma("OLD", "-")}
+            WHERE problema_id = OLD.problema_id;
+        END
+    ''')
+    
+    # Bancos criados antes do histograma: preencher a partir dos votos existentes
+    if histograma_novo:
+        cursor.execute(f'''
+            INSERT INTO histograma_votos (problema_id, {", ".join(COLUNAS_HISTOGRAMA)})
+            SELECT problema_id, {", ".join(
+                f"SUM({coluna} = {n})" for _, coluna in CRITERIOS_HISTOGRAMA for n in range(1, 6)
+            )}
+            FROM votos GROUP BY problema_id
+        ''')
+
+def migracao_indices_consultas(conn):
+    """v3: índices dedicados às consultas frequentes (ver CONSULTAS_CRITICAS)"""
+    # Listagem de problemas ordenada sem ordenação temporária
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_problemas_criado_em ON problemas (criado_em)')
+    # Votos de um participante respondidos só pelo índice (a PK entra implicitamente)
+    conn.execute('DROP INDEX IF EXISTS idx_votos_participante')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_votos_participante_notas
+        ON votos (participante_id, gravidade, urgencia, tendencia)
+    ''')
+
+def migracao_eventos_votos(conn):
+    """v4: log de eventos de voto só de acréscimo, snapshots do histograma e voto por upsert"""
+    cursor = conn.cursor()
+    
+    # Cada voto enviado (novo ou alteração) vira um evento; AUTOINCREMENT garante ids
+    # crescentes e nunca reaproveitados, base da reconstrução por snapshot + eventos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS eventos_votos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            problema_id INTEGER NOT NULL,
+            participante_id INTEGER NOT NULL,
+            gravidade INTEGER NOT NULL,
+            urgencia INTEGER NOT NULL,
+            tendencia INTEGER NOT NULL,
+            criado_em INTEGER NOT NULL
+        )
+    ''')
+    # Voto anterior do mesmo participante no mesmo problema (reconstrução) e busca por instante
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_eventos_votos_par
+        ON eventos_votos (problema_id, participante_id, id)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_eventos_votos_criado_em ON eventos_votos (criado_em)')
+    
+    # Snapshots: histograma completo depois do evento `evento_id`
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshots_votos (
+            id INTEGER PRIMARY KEY,
+            evento_id INTEGER NOT NULL,
+            criado_em INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_snapshots_votos_evento ON snapshots_votos (evento_id)')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS snapshots_histograma (
+            snapshot_id INTEGER NOT NULL,
+            problema_id INTEGER NOT NULL,
+            {", ".join(f"{col} INTEGER NOT NULL" for col in COLUNAS_HISTOGRAMA)},
+            PRIMARY KEY (snapshot_id, problema_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # votos passa a ser a projeção "último voto", gravada por upsert (UPDATE no lugar, sem
+    # apagar e reinserir): o trigger que compensava o INSERT OR REPLACE sai, e o UPDATE
+    # já é tratado por histograma_votos_atualizacao
+    cursor.execute('DROP TRIGGER IF EXISTS histograma_votos_substituicao')
+    
+    # O log é alimentado pela própria projeção: qualquer escritor (gut2.py, importação,
+    # fila de votos) registra o evento na mesma transação
+    for nome, evento in (("eventos_votos_insercao", "INSERT"), ("eventos_votos_atualizacao", "UPDATE")):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {nome} AFTER {evento} ON votos
+            BEGIN
+                INSERT INTO eventos_votos (problema_id, participante_id, gravidade, urgencia, tendencia, criado_em)
+                VALUES (NEW.problema_id, NEW.participante_id, NEW.gravidade, NEW.urgencia, NEW.tendencia, NEW.criado_em);
+            END
+        ''')
+    
+    # Problema removido sai também do histórico, para não deixar eventos órfãos
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS eventos_votos_problema_removido AFTER DELETE ON problemas
+        BEGIN
+            DELETE FROM eventos_votos WHERE problema_id = OLD.id;
+            DELETE FROM snapshots_histograma WHERE problema_id = OLD.id;
+        END
+    ''')
+    
+    # Votos já existentes entram no log como o primeiro evento de cada par
+    cursor.execute('''
+        INSERT INTO eventos_votos (problema_id, participante_id, gravidade, urgencia, tendencia, criado_em)
+        SELECT problema_id, participante_id, gravidade, urgencia, tendencia, criado_em
+        FROM votos ORDER BY criado_em
+    ''')
+
+def migracao_remocoes_no_historico(conn):
+    """v5: voto apagado vira evento de remoção; o log de eventos nunca é apagado"""
+    cursor = conn.cursor()
+    
+    # Remoção = evento com as notas do voto removido e removido = 1
+    cursor.execute('ALTER TABLE eventos_votos ADD COLUMN removido INTEGER NOT NULL DEFAULT 0')
+    
+    # Remover um problema apagava os eventos dele; agora só os votos saem (e o log registra)
+    cursor.execute('DROP TRIGGER IF EXISTS eventos_votos_problema_removido')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS eventos_votos_remocao AFTER DELETE ON votos
+        BEGIN
+            INSERT INTO eventos_votos (problema_id, participante_id, gravidade, urgencia, tendencia, criado_em, removido)
+            VALUES (OLD.problema_id, OLD.participante_id, OLD.gravidade, OLD.urgencia, OLD.tendencia,
+                    CAST(strftime('%s', 'now') AS INTEGER), 1);
+        END
+    ''')
+
+# Migrações versionadas por PRAGMA user_version: a migração de índice i leva o banco
+# da versão i para i + 1. Só acrescentar ao final; nunca alterar uma já publicada.
+MIGRACOES = [
+    migracao_esquema_normalizado,
+    migracao_histograma_votos,
+    migracao_indices_consultas,
+    migracao_eventos_votos,
+    migracao_remocoes_no_historico,
+]
+
+def aplicar_migracoes(conn):
+    """Aplica as migrações pendentes, cada uma atomicamente junto com o novo user_version"""
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRACOES):
+        return
+    
+    for versao, migracao in enumerate(MIGRACOES, 1):
+        # BEGIN IMMEDIATE + releitura da versão: outro processo pode ter migrado antes
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] < versao:
+                migracao(conn)
+                conn.execute(f'PRAGMA user_version = {versao}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+# Aplicados a cada conexão nova. Em modo WAL leitores (tela de resultados) não bloqueiam
+# quem está votando.
+PRAGMAS_CONEXAO = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # seguro em WAL; fsync só nos checkpoints
+    "PRAGMA busy_timeout = 5000",   # espera até 5s pelo lock de escrita em vez de falhar
+    "PRAGMA temp_store = MEMORY",
+)
+
+# ===================== POOL DE CONEXÕES =====================
+# Conexões reutilizadas entre reruns e sessões do mesmo processo; cada app guarda o pool
+# de cada arquivo em cache (criar_pool)
+TAMANHO_POOL = 8
+
+class PoolConexoes:
+    """Pool de conexões SQLite compartilhado pelas sessões do processo"""
+    
+    def __init__(self, caminho, tamanho=TAMANHO_POOL):
+        self.caminho = caminho
+        self._livres = queue.LifoQueue(maxsize=tamanho)
+        self._fechado = False
+    
+    def _nova_conexao(self):
+        # check_same_thread=False: a conexão passa entre as threads de rerun do Streamlit,
+        # mas o pool garante que só uma thread a usa por vez
+        conn = sqlite3.connect(self.caminho, timeout=5, check_same_thread=False, cached_statements=256)
+        for pragma in PRAGMAS_CONEXAO:
+            conn.execute(pragma)
+        return conn
+    
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão; transações não finalizadas são desfeitas na devolução"""
+        try:
+            conn = self._livres.get_nowait()
+        except queue.Empty:
+            conn = self._nova_conexao()
+        
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                if self._fechado:
+                    raise queue.Full
+                self._livres.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def fechar(self):
+        """Fecha as conexões livres; as emprestadas são fechadas na devolução"""
+        self._fechado = True
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                return
+
+def abrir_pool(caminho):
+    """Pool para o arquivo `caminho`, com as migrações pendentes já aplicadas"""
+    pool = PoolConexoes(caminho)
+    with pool.conexao() as conn:
+        aplicar_migracoes(conn)
+    return pool
+
+# ===================== OFICINAS =====================
+def nome_arquivo_oficina(momento):
+    """Nome do banco de uma oficina iniciada em `momento` (datetime); ordena cronologicamente"""
+    return f"oficina_{momento.strftime('%Y%m%d_%H%M%S_%f')}.db"
+
+def arquivar_banco_legado(caminho, diretorio):
+    """Copia o banco `caminho` (anterior às oficinas, versionado no git) para `diretorio`
+    com o nome datado das oficinas e retorna o caminho da cópia; o original não é alterado.
+    
+    A data é a do primeiro problema cadastrado, como nos bancos criados pelo reset.
+    """
+    origem = sqlite3.connect(caminho, timeout=30)
+    try:
+        inicio = origem.execute('SELECT MIN(criado_em) FROM problemas').fetchone()[0]
+        destino_caminho = os.path.join(
+            diretorio, nome_arquivo_oficina(datetime.fromtimestamp(inicio or os.path.getmtime(caminho)))
+        )
+        destino = sqlite3.connect(destino_caminho)
+        try:
+            origem.backup(destino)
+        finally:
+            destino.close()
+    finally:
+        origem.close()
+    return destino_caminho
+
+# ===================== CONSULTAS =====================
+# Gravação de votos (fila de escrita, importação em lote)
+SQL_INSERIR_PARTICIPANTE = 'INSERT OR IGNORE INTO participantes (nome) VALUES (?)'
+# Upsert na projeção votos; os triggers acrescentam o evento e ajustam o histograma
+SQL_INSERIR_VOTO = '''
+    INSERT INTO votos
+    (problema_id, participante_id, gravidade, urgencia, tendencia, criado_em)
+    VALUES (?, (SELECT id FROM participantes WHERE nome = ?), ?, ?, ?, ?)
+    ON CONFLICT (problema_id, participante_id) DO UPDATE SET
+        gravidade = excluded.gravidade, urgencia = excluded.urgencia,
+        tendencia = excluded.tendencia, criado_em = excluded.criado_em
+'''
+
+# Consultas frequentes (reruns, votação e dashboard); verificadas por verificar_planos_consultas
+SQL_LISTAR_PROBLEMAS = 'SELECT id, codigo, nome, descricao, criado_em FROM problemas ORDER BY criado_em'
+SQL_VOTOS_PARTICIPANTE = '''
+    SELECT votos.problema_id, votos.gravidade, votos.urgencia, votos.tendencia
+    FROM participantes JOIN votos ON votos.participante_id = participantes.id
+    WHERE participantes.nome = ?
+'''
+SQL_HISTOGRAMAS = f'SELECT problema_id, {", ".join(COLUNAS_HISTOGRAMA)} FROM histograma_votos'
+# Totais gerais sem varrer votos: contagem vem do histograma e participantes ativos via índice
+SQL_ESTATISTICAS_GERAIS = f'''
+    SELECT
+        (SELECT COUNT(*) FROM problemas),
+        (SELECT COALESCE(SUM({" + ".join(COLUNAS_HISTOGRAMA[:5])}), 0) FROM histograma_votos),
+        (SELECT COUNT(*) FROM participantes
+         WHERE EXISTS (SELECT 1 FROM votos WHERE votos.participante_id = participantes.id))
+'''
+# Distribuição de todos os votos (1 a 5) por critério, somando os histogramas dos problemas
+SQL_DISTRIBUICAO_VOTOS = f'''
+    SELECT {", ".join(f"COALESCE(SUM({c}), 0)" for c in COLUNAS_HISTOGRAMA)} FROM histograma_votos
+'''
+SQL_REMOVER_VOTOS_PROBLEMA = 'DELETE FROM votos WHERE problema_id = ?'
+# Leitura completa de votos para o mapa participante × problema (feita uma vez por versão)
+SQL_MATRIZ_VOTOS = 'SELECT participante_id, problema_id, gravidade, urgencia, tendencia FROM votos'
+SQL_PARTICIPANTES_ATIVOS = '''
+    SELECT id, nome FROM participantes
+    WHERE EXISTS (SELECT 1 FROM votos WHERE votos.participante_id = participantes.id)
+    ORDER BY nome
+'''
+
+# Histórico de votos (eventos + snapshots)
+SQL_EVENTO_NO_MOMENTO = '''
+    SELECT id FROM eventos_votos WHERE criado_em <= ? ORDER BY criado_em DESC, id DESC LIMIT 1
+'''
+SQL_SNAPSHOT_ANTERIOR = '''
+    SELECT id, evento_id FROM snapshots_votos WHERE evento_id <= ? ORDER BY evento_id DESC LIMIT 1
+'''
+# Painel de auditoria (a cada rerun do admin): eventos e snapshots nunca são apagados, então
+# MAX(id) dá o total sem contar linha a linha; MIN/MAX de criado_em em subconsultas separadas
+# para cada uma virar uma busca na ponta do índice
+SQL_RESUMO_HISTORICO = '''
+    SELECT
+        (SELECT COALESCE(MAX(id), 0) FROM eventos_votos),
+        (SELECT COALESCE(MAX(id), 0) FROM snapshots_votos),
+        (SELECT MIN(criado_em) FROM eventos_votos),
+        (SELECT MAX(criado_em) FROM eventos_votos)
+'''
+# Os eventos mais recentes: faixa de ids a partir do último (passar o limite duas vezes);
+# eventos de problemas já removidos continuam na lista
+SQL_ULTIMOS_EVENTOS = '''
+    SELECT eventos_votos.criado_em, COALESCE(problemas.nome, '(problema removido)'), participantes.nome,
+           eventos_votos.gravidade, eventos_votos.urgencia, eventos_votos.tendencia, eventos_votos.removido
+    FROM eventos_votos
+    LEFT JOIN problemas ON problemas.id = eventos_votos.problema_id
+    JOIN participantes ON participantes.id = eventos_votos.participante_id
+    WHERE eventos_votos.id > (SELECT MAX(id) FROM eventos_votos) - ?
+    ORDER BY eventos_votos.id DESC LIMIT ?
+'''
+# Cada evento do intervalo com o voto que ele substituiu ou removeu (NULL se o par não
+# tinha voto valendo: primeiro voto ou voto depois de uma remoção)
+SQL_EVENTOS_INTERVALO = '''
+    SELECT e.problema_id, e.gravidade, e.urgencia, e.tendencia, e.removido,
+           a.gravidade, a.urgencia, a.tendencia
+    FROM eventos_votos AS e
+    LEFT JOIN eventos_votos AS a ON a.id = (
+        SELECT MAX(id) FROM eventos_votos
+        WHERE problema_id = e.problema_id AND participante_id = e.participante_id AND id < e.id
+    ) AND a.removido = 0
+    WHERE e.id > ? AND e.id <= ?
+'''
+
+# Linha do tempo: tudo por faixa de criado_em (inteiro, indexado em eventos_votos)
+SQL_VOTOS_DESDE = 'SELECT COUNT(*) FROM eventos_votos WHERE criado_em > ? AND removido = 0'
+SQL_LINHA_DO_TEMPO = '''
+    SELECT e.criado_em, e.problema_id, e.gravidade, e.urgencia, e.tendencia, e.removido,
+           a.gravidade, a.urgencia, a.tendencia
+    FROM eventos_votos AS e
+    LEFT JOIN eventos_votos AS a ON a.id = (
+        SELECT MAX(id) FROM eventos_votos
+        WHERE problema_id = e.problema_id AND participante_id = e.participante_id AND id < e.id
+    ) AND a.removido = 0
+    WHERE e.criado_em > ? AND e.criado_em <= ?
+'''
+
+# Consultas quentes e parâmetros de exemplo para EXPLAIN QUERY PLAN
+CONSULTAS_CRITICAS = {
+    "listar_problemas": (SQL_LISTAR_PROBLEMAS, ()),
+    "votos_participante": (SQL_VOTOS_PARTICIPANTE, ("participante",)),
+    "histogramas": (SQL_HISTOGRAMAS, ()),
+    "estatisticas_gerais": (SQL_ESTATISTICAS_GERAIS, ()),
+    "distribuicao_votos": (SQL_DISTRIBUICAO_VOTOS, ()),
+    "inserir_participante": (SQL_INSERIR_PARTICIPANTE, ("participante",)),
+    "inserir_voto": (SQL_INSERIR_VOTO, (1, "participante", 3, 3, 3, 0)),
+    "evento_no_momento": (SQL_EVENTO_NO_MOMENTO, (0,)),
+    "snapshot_anterior": (SQL_SNAPSHOT_ANTERIOR, (0,)),
+    "resumo_historico": (SQL_RESUMO_HISTORICO, ()),
+    "ultimos_eventos": (SQL_ULTIMOS_EVENTOS, (50, 50)),
+    "eventos_intervalo": (SQL_EVENTOS_INTERVALO, (0, 0)),
+    "votos_desde": (SQL_VOTOS_DESDE, (0,)),
+    "linha_do_tempo": (SQL_LINHA_DO_TEMPO, (0, 0)),
+    "remover_votos_problema": (SQL_REMOVER_VOTOS_PROBLEMA, (1,)),
+}
+# Tabelas que crescem com o número de votos: nunca podem ser varridas por consultas quentes
+TABELAS_SEM_VARREDURA = ("votos", "eventos_votos")
+
+# O plano cita a tabela pelo apelido quando a consulta usa "FROM tabela AS apelido"
+_RE_APELIDO = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)\s+AS\s+(\w+)", re.IGNORECASE)
+_RE_VARREDURA = re.compile(r"^SCAN (\w+)")
+
+def verificar_planos_consultas(conn):
+    """Roda EXPLAIN QUERY PLAN nas consultas críticas usando a conexão `conn`.
+    
+    Retorna {nome: (linhas_do_plano, falhas)}; é falha varrer uma tabela de
+    TABELAS_SEM_VARREDURA (mesmo por índice, com ou sem apelido) ou ordenar com
+    B-tree temporária.
+    """
+    resultado = {}
+    for nome, (sql, parametros) in CONSULTAS_CRITICAS.items():
+        apelidos = {apelido: tabela for tabela, apelido in _RE_APELIDO.findall(sql)}
+        plano = [linha[3] for linha in conn.execute("EXPLAIN QUERY PLAN " + sql, parametros)]
+        falhas = []
+        for passo in plano:
+            varredura = _RE_VARREDURA.match(passo)
+            tabela = varredura and apelidos.get(varredura.group(1), varredura.group(1))
+            if "USE TEMP B-TREE" in passo or tabela in TABELAS_SEM_VARREDURA:
+                falhas.append(passo)
+        resultado[nome] = (plano, falhas)
+    return resultado
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 from io import BytesIO
 
 st.set_page_config(
@@ -109,6 +110,111 @@ def classificar_prioridade(pontuacao):
     else:
         return "🟢 BAIXA", "priority-low"
 
+# Figuras montadas uma vez por conjunto de problemas: mover os sliders do formulário
+# causa rerun, mas reaproveita as especificações prontas enquanto a lista não muda
+RADARES_POR_PAGINA = 6
+
+def dataframe_ordenado(problemas):
+    """Tabela dos problemas por pontuação GUT, com a classificação de prioridade"""
+    df_sorted = pd.DataFrame(
+        problemas, columns=["Problema", "Gravidade", "Urgência", "Tendência", "Pontuação GUT"]
+    ).sort_values(by="Pontuação GUT", ascending=False).reset_index(drop=True)
+    df_sorted["Prioridade"] = df_sorted["Pontuação GUT"].apply(lambda x: classificar_prioridade(x)[0])
+    return df_sorted
+
+# Arquivos de exportação gerados só quando alguém clica em baixar e guardados por conjunto
+# de problemas: novos downloads da mesma lista reaproveitam os bytes prontos
+@st.cache_data(max_entries=8, show_spinner=False)
+def exportar_csv(problemas):
+    """CSV (bytes) da tabela de problemas priorizados"""
+    return dataframe_ordenado(problemas).to_csv(index=False).encode('utf-8')
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def exportar_excel(problemas):
+    """Planilha Excel (bytes) da tabela de problemas priorizados"""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        dataframe_ordenado(problemas).to_excel(writer, sheet_name='Matriz GUT', index=False)
+    return output.getvalue()
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def figuras_problemas(problemas):
+    """Especificações (dict) dos gráficos de ranking, radar e distribuição.
+    `problemas` é uma tupla de tuplas (problema, gravidade, urgência, tendência, pontuação)."""
+    df_sorted = dataframe_ordenado(problemas)
+    
+    fig_bar = px.bar(
+        df_sorted,
+        x="Pontuação GUT",
+        y="Problema",
+        orientation="h",
+        color="Pontuação GUT",
+        color_continuous_scale="RdYlGn_r",
+        title="Ranking de Problemas por Pontuação GUT"
+    )
+    fig_bar.update_layout(height=400)
+    
+    fig_radar = None
+    if len(df_sorted) <= 5:  # Limitar radar sobreposto para não ficar confuso
+        fig_radar = go.Figure()
+        
+        for _, row in df_sorted.iterrows():
+            fig_radar.add_trace(go.Scatterpolar(
+                r=[row["Gravidade"], row["Urgência"], row["Tendência"]],
+                theta=["Gravidade", "Urgência", "Tendência"],
+                fill='toself',
+                name=row["Problema"][:20] + "..." if len(row["Problema"]) > 20 else row["Problema"]
+            ))
+        
+        fig_radar.update_layout(
+            polar=dict(radialaxis=dict(visible=True, range=[0, 5])),
+            title="Comparação G-U-T por Problema"
+        )
+    
+    fig_hist = px.histogram(
+        df_sorted,
+        x="Pontuação GUT",
+        nbins=10,
+        title="Distribuição das Pontuações GUT"
+    )
+    
+    return {
+        "ranking": fig_bar.to_dict(),
+        "radar": fig_radar.to_dict() if fig_radar is not None else None,
+        "distribuicao": fig_hist.to_dict(),
+    }
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def figura_radares_pagina(problemas, pagina):
+    """Radares pequenos (um por problema) da página `pagina`, em ordem de pontuação.
+    Só RADARES_POR_PAGINA problemas vão ao navegador por vez, qualquer que seja o total."""
+    ordenados = sorted(problemas, key=lambda p: p[4], reverse=True)
+    inicio = (pagina - 1) * RADARES_POR_PAGINA
+    pagina_atual = ordenados[inicio:inicio + RADARES_POR_PAGINA]
+    
+    colunas = 3
+    linhas = -(-len(pagina_atual) // colunas)
+    fig = make_subplots(
+        rows=linhas,
+        cols=colunas,
+        specs=[[{"type": "polar"}] * colunas for _ in range(linhas)],
+        subplot_titles=[
+            (nome[:20] + "..." if len(nome) > 20 else nome) + f" ({pontuacao})"
+            for nome, _, _, _, pontuacao in pagina_atual
+        ]
+    )
+    for i, (nome, gravidade, urgencia, tendencia, _) in enumerate(pagina_atual):
+        fig.add_trace(go.Scatterpolar(
+            r=[gravidade, urgencia, tendencia],
+            theta=["Gravidade", "Urgência", "Tendência"],
+            fill='toself',
+            name=nome
+        ), row=i // colunas + 1, col=i % colunas + 1)
+    
+    fig.update_polars(radialaxis=dict(visible=True, range=[0, 5], showticklabels=False))
+    fig.update_layout(height=320 * linhas, showlegend=False)
+    return fig.to_dict()
+
 # Botão para carregar exemplos do judiciário
 if st.button("📋 Carregar Exemplos do Judiciário"):
     exemplos = [
@@ -170,11 +276,12 @@ with col1:
 with col2:
     if st.session_state.problemas:
         st.subheader("📋 Problemas Priorizados")
-        df = pd.DataFrame(st.session_state.problemas)
-        df_sorted = df.sort_values(by="Pontuação GUT", ascending=False).reset_index(drop=True)
-        
-        # Adicionar classificação de prioridade
-        df_sorted["Prioridade"] = df_sorted["Pontuação GUT"].apply(lambda x: classificar_prioridade(x)[0])
+        registros = tuple(
+            (p["Problema"], p["Gravidade"], p["Urgência"], p["Tendência"], p["Pontuação GUT"])
+            for p in st.session_state.problemas
+        )
+        # Ordenado por pontuação, com classificação de prioridade
+        df_sorted = dataframe_ordenado(registros)
         
         # Exibir tabela com formatação
         st.dataframe(
@@ -220,47 +327,25 @@ with col2:
         
         tab1, tab2, tab3 = st.tabs(["📊 Ranking", "🎯 Radar", "📈 Distribuição"])
         
+        figuras = figuras_problemas(registros)
+        
         with tab1:
-            fig_bar = px.bar(
-                df_sorted,
-                x="Pontuação GUT",
-                y="Problema",
-                orientation="h",
-                color="Pontuação GUT",
-                color_continuous_scale="RdYlGn_r",
-                title="Ranking de Problemas por Pontuação GUT"
-            )
-            fig_bar.update_layout(height=400)
-            st.plotly_chart(fig_bar, use_container_width=True)
+            st.plotly_chart(figuras["ranking"], use_container_width=True)
         
         with tab2:
-            if len(df_sorted) <= 5:  # Limitar radar para não ficar confuso
-                fig_radar = go.Figure()
-                
-                for _, row in df_sorted.iterrows():
-                    fig_radar.add_trace(go.Scatterpolar(
-                        r=[row["Gravidade"], row["Urgência"], row["Tendência"]],
-                        theta=["Gravidade", "Urgência", "Tendência"],
-                        fill='toself',
-                        name=row["Problema"][:20] + "..." if len(row["Problema"]) > 20 else row["Problema"]
-                    ))
-                
-                fig_radar.update_layout(
-                    polar=dict(radialaxis=dict(visible=True, range=[0, 5])),
-                    title="Comparação G-U-T por Problema"
-                )
-                st.plotly_chart(fig_radar, use_container_width=True)
+            if figuras["radar"] is not None:
+                st.plotly_chart(figuras["radar"], use_container_width=True)
             else:
-                st.info("📝 Gráfico radar disponível para até 5 problemas. Remova alguns para visualizar.")
+                # Muitos problemas: um radar pequeno por problema, paginado
+                total_paginas = -(-len(registros) // RADARES_POR_PAGINA)
+                pagina = st.number_input(
+                    f"Página dos radares (de {total_paginas})", min_value=1, max_value=total_paginas, value=1, step=1,
+                    key="pagina_radares"
+                )
+                st.plotly_chart(figura_radares_pagina(registros, pagina), use_container_width=True)
         
         with tab3:
-            fig_hist = px.histogram(
-                df_sorted,
-                x="Pontuação GUT",
-                nbins=10,
-                title="Distribuição das Pontuações GUT"
-            )
-            st.plotly_chart(fig_hist, use_container_width=True)
+            st.plotly_chart(figuras["distribuicao"], use_container_width=True)
 
         # Exportação melhorada
         st.subheader("📥 Exportar Resultados")
@@ -268,23 +353,18 @@ with col2:
         col_csv, col_excel = st.columns(2)
         
         with col_csv:
-            csv = df_sorted.to_csv(index=False).encode('utf-8')
             st.download_button(
                 "⬇️ Baixar CSV",
-                data=csv,
+                data=lambda: exportar_csv(registros),
                 file_name=f"matriz_gut_tribunal_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.csv",
                 mime="text/csv"
             )
         
         with col_excel:
-            # Criar Excel em memória
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_sorted.to_excel(writer, sheet_name='Matriz GUT', index=False)
-            
+            # Excel montado em memória só no clique
             st.download_button(
                 "⬇️ Baixar Excel",
-                data=output.getvalue(),
+                data=lambda: exportar_excel(registros),
                 file_name=f"matriz_gut_tribunal_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
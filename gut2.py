@@ -2,9 +2,14 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import sqlite3
+import threading
+import time
 from datetime import datetime
 import os
 
+# Esquema e migrações compartilhados com o gut3.py (mesmo banco, mesma user_version)
+from banco_gut import SQL_REMOVER_VOTOS_PROBLEMA, abrir_pool, arquivar_banco_legado, nome_arquivo_oficina
+
 st.set_page_config(
     page_title="Matriz GUT 2.0 - Votação Colaborativa",
     page_icon="⚖️",
@@ -63,200 +68,218 @@ st.markdown("""
 # ===================== BANCO DE DADOS =====================
 DATABASE_FILE = 'matriz_gut.db'
 
-def init_database():
-    """Inicializa o banco de dados SQLite"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    # Tabela de problemas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS problemas (
-            id TEXT PRIMARY KEY,
-            nome TEXT NOT NULL,
-            descricao TEXT,
-            timestamp TEXT
-        )
-    ''')
-    
-    # Tabela de votos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS votos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            problema_id TEXT,
-            participante TEXT,
-            gravidade INTEGER,
-            urgencia INTEGER,
-            tendencia INTEGER,
-            timestamp TEXT,
-            UNIQUE(problema_id, participante),
-            FOREIGN KEY (problema_id) REFERENCES problemas (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+# Oficinas: mesmo ponteiro de gut3.py (nome do banco em andamento dentro de DIRETORIO_OFICINAS)
+DIRETORIO_OFICINAS = 'oficinas'
+PONTEIRO_OFICINA_ATUAL = os.path.join(DIRETORIO_OFICINAS, 'ATUAL')
+
+def banco_atual():
+    """Caminho do banco da oficina em andamento"""
+    try:
+        with open(PONTEIRO_OFICINA_ATUAL, encoding='utf-8') as f:
+            return os.path.join(DIRETORIO_OFICINAS, f.read().strip())
+    except FileNotFoundError:
+        return DATABASE_FILE
+
+@st.cache_resource
+def criar_pool(caminho):
+    """Pool único por processo para o arquivo `caminho` (sobrevive a reruns e é
+    compartilhado entre sessões).
+    
+    Na criação aplica as migrações pendentes; reruns seguintes não executam DDL.
+    """
+    return abrir_pool(caminho)
+
+def obter_pool():
+    """Pool do banco da oficina em andamento"""
+    return criar_pool(banco_atual())
 
 def get_db_connection():
-    """Retorna conexão com o banco"""
-    return sqlite3.connect(DATABASE_FILE)
+    """Retorna conexão do pool (usar com `with get_db_connection() as conn:`)"""
+    return obter_pool().conexao()
 
 def gerar_id_problema(nome):
-    """Gera ID único para o problema"""
+    """Gera o código único do problema (hash do nome; evita cadastros duplicados)"""
     import hashlib
     return hashlib.md5(nome.encode()).hexdigest()[:12]
 
 def adicionar_problema_db(nome, descricao=""):
     """Adiciona problema no banco de dados"""
-    pid = gerar_id_problema(nome)
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    codigo = gerar_id_problema(nome)
+    criado_em = int(time.time())
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
-            INSERT OR REPLACE INTO problemas (id, nome, descricao, timestamp)
-            VALUES (?, ?, ?, ?)
-        ''', (pid, nome, descricao, timestamp))
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao adicionar problema: {e}")
-        return False
-    finally:
-        conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT INTO problemas (codigo, nome, descricao, criado_em)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (codigo) DO UPDATE SET
+                    nome = excluded.nome, descricao = excluded.descricao, criado_em = excluded.criado_em
+            ''', (codigo, nome, descricao, criado_em))
+            conn.commit()
+            return True
+        except Exception as e:
+            st.error(f"Erro ao adicionar problema: {e}")
+            return False
 
 def listar_problemas_db():
     """Lista todos os problemas do banco"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT id, nome, descricao, timestamp FROM problemas ORDER BY timestamp')
-    problemas = cursor.fetchall()
-    conn.close()
-    
-    return [{"id": p[0], "nome": p[1], "descricao": p[2], "timestamp": p[3]} for p in problemas]
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT id, codigo, nome, descricao, criado_em FROM problemas ORDER BY criado_em')
+        problemas = cursor.fetchall()
+        
+        return [
+            {"id": p[0], "codigo": p[1], "nome": p[2], "descricao": p[3],
+             "timestamp": datetime.fromtimestamp(p[4]).strftime('%Y-%m-%d %H:%M:%S')}
+            for p in problemas
+        ]
 
 def remover_problema_db(problema_id):
     """Remove problema e seus votos do banco"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        # Remove votos do problema
-        cursor.execute('DELETE FROM votos WHERE problema_id = ?', (problema_id,))
-        # Remove o problema
-        cursor.execute('DELETE FROM problemas WHERE id = ?', (problema_id,))
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao remover problema: {e}")
-        return False
-    finally:
-        conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        try:
+            # Remove votos do problema e seu histograma
+            cursor.execute(SQL_REMOVER_VOTOS_PROBLEMA, (problema_id,))
+            cursor.execute('DELETE FROM histograma_votos WHERE problema_id = ?', (problema_id,))
+            # Remove o problema
+            cursor.execute('DELETE FROM problemas WHERE id = ?', (problema_id,))
+            conn.commit()
+            return True
+        except Exception as e:
+            st.error(f"Erro ao remover problema: {e}")
+            return False
 
 def votar_problema_db(problema_id, participante, gravidade, urgencia, tendencia):
     """Registra ou atualiza voto no banco"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    criado_em = int(time.time())
     
-    try:
-        cursor.execute('''
-            INSERT OR REPLACE INTO votos 
-            (problema_id, participante, gravidade, urgencia, tendencia, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (problema_id, participante, gravidade, urgencia, tendencia, timestamp))
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao registrar voto: {e}")
-        return False
-    finally:
-        conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('INSERT OR IGNORE INTO participantes (nome) VALUES (?)', (participante,))
+            # Upsert (não INSERT OR REPLACE): os triggers de histograma e de log de eventos
+            # (banco_gut.MIGRACOES) tratam o voto alterado como UPDATE
+            cursor.execute('''
+                INSERT INTO votos 
+                (problema_id, participante_id, gravidade, urgencia, tendencia, criado_em)
+                VALUES (?, (SELECT id FROM participantes WHERE nome = ?), ?, ?, ?, ?)
+                ON CONFLICT (problema_id, participante_id) DO UPDATE SET
+                    gravidade = excluded.gravidade, urgencia = excluded.urgencia,
+                    tendencia = excluded.tendencia, criado_em = excluded.criado_em
+            ''', (problema_id, participante, gravidade, urgencia, tendencia, criado_em))
+            conn.commit()
+            return True
+        except Exception as e:
+            st.error(f"Erro ao registrar voto: {e}")
+            return False
 
 def obter_voto_participante_db(problema_id, participante):
     """Obtém voto específico de um participante para um problema"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT gravidade, urgencia, tendencia FROM votos 
-        WHERE problema_id = ? AND participante = ?
-    ''', (problema_id, participante))
-    
-    voto = cursor.fetchone()
-    conn.close()
-    
-    if voto:
-        return {"gravidade": voto[0], "urgencia": voto[1], "tendencia": voto[2]}
-    return None
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT v.gravidade, v.urgencia, v.tendencia
+            FROM votos v JOIN participantes p ON p.id = v.participante_id
+            WHERE v.problema_id = ? AND p.nome = ?
+        ''', (problema_id, participante))
+        
+        voto = cursor.fetchone()
+        
+        if voto:
+            return {"gravidade": voto[0], "urgencia": voto[1], "tendencia": voto[2]}
+        return None
 
 def calcular_medias_db(problema_id):
     """Calcula médias dos votos para um problema"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT COUNT(*), AVG(gravidade), AVG(urgencia), AVG(tendencia)
-        FROM votos WHERE problema_id = ?
-    ''', (problema_id,))
-    
-    resultado = cursor.fetchone()
-    conn.close()
-    
-    if resultado and resultado[0] > 0:
-        total, mg, mu, mt = resultado
-        return {
-            "total": int(total),
-            "mg": round(mg, 2),
-            "mu": round(mu, 2), 
-            "mt": round(mt, 2),
-            "gut": round(mg * mu * mt, 2)
-        }
-    return None
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT COUNT(*), AVG(gravidade), AVG(urgencia), AVG(tendencia)
+            FROM votos WHERE problema_id = ?
+        ''', (problema_id,))
+        
+        resultado = cursor.fetchone()
+        
+        if resultado and resultado[0] > 0:
+            total, mg, mu, mt = resultado
+            return {
+                "total": int(total),
+                "mg": round(mg, 2),
+                "mu": round(mu, 2), 
+                "mt": round(mt, 2),
+                "gut": round(mg * mu * mt, 2)
+            }
+        return None
 
 def obter_estatisticas_db():
     """Obtém estatísticas gerais do banco"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Total de problemas
-    cursor.execute('SELECT COUNT(*) FROM problemas')
-    total_problemas = cursor.fetchone()[0]
-    
-    # Total de votos
-    cursor.execute('SELECT COUNT(*) FROM votos')
-    total_votos = cursor.fetchone()[0]
-    
-    # Participantes únicos
-    cursor.execute('SELECT COUNT(DISTINCT participante) FROM votos')
-    participantes_unicos = cursor.fetchone()[0]
-    
-    conn.close()
-    
-    return {
-        "problemas": total_problemas,
-        "votos": total_votos,
-        "participantes": participantes_unicos
-    }
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Total de problemas
+        cursor.execute('SELECT COUNT(*) FROM problemas')
+        total_problemas = cursor.fetchone()[0]
+        
+        # Total de votos
+        cursor.execute('SELECT COUNT(*) FROM votos')
+        total_votos = cursor.fetchone()[0]
+        
+        # Participantes únicos
+        cursor.execute('SELECT COUNT(DISTINCT participante_id) FROM votos')
+        participantes_unicos = cursor.fetchone()[0]
+        
+        return {
+            "problemas": total_problemas,
+            "votos": total_votos,
+            "participantes": participantes_unicos
+        }
+
+# Espera antes de selar a oficina encerrada: votos já a caminho terminam no banco antigo
+PRAZO_SELAGEM_S = 2
+
+def selar_oficina(caminho):
+    """Compacta o banco de uma oficina encerrada e o deixa somente leitura"""
+    time.sleep(PRAZO_SELAGEM_S)
+    # Conexões do pool antigo manteriam o arquivo aberto para sempre
+    criar_pool(caminho).fechar()
+    criar_pool.clear(caminho)
+    if caminho == DATABASE_FILE:
+        # O banco legado é versionado no git: sela-se uma cópia em DIRETORIO_OFICINAS
+        caminho = arquivar_banco_legado(caminho, DIRETORIO_OFICINAS)
+    conn = sqlite3.connect(caminho, timeout=30)
+    try:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    os.chmod(caminho, 0o444)
 
 def resetar_banco_db():
-    """Reseta completamente o banco de dados"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    """Encerra a oficina atual e começa outra com banco vazio (mesma troca de ponteiro de gut3.py)"""
+    anterior = banco_atual()
     try:
-        cursor.execute('DELETE FROM votos')
-        cursor.execute('DELETE FROM problemas')
-        conn.commit()
-        return True
+        os.makedirs(DIRETORIO_OFICINAS, exist_ok=True)
+        nome = nome_arquivo_oficina(datetime.now())
+        criar_pool(os.path.join(DIRETORIO_OFICINAS, nome))
+        temporario = PONTEIRO_OFICINA_ATUAL + '.novo'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(nome)
+        os.replace(temporario, PONTEIRO_OFICINA_ATUAL)
     except Exception as e:
         st.error(f"Erro ao resetar banco: {e}")
         return False
-    finally:
-        conn.close()
+    
+    threading.Thread(target=selar_oficina, args=(anterior,), name="selar-oficina", daemon=True).start()
+    return True
 
 def classificar_prioridade(pontuacao):
     """Classifica prioridade baseada na pontuação GUT"""
@@ -270,8 +293,8 @@ if 'participante_id' not in st.session_state:
 if 'admin_logado' not in st.session_state: 
     st.session_state.admin_logado = False
 
-# Inicializar banco na primeira execução
-init_database()
+# Preparar banco (migrações rodam uma vez por processo, não a cada rerun)
+obter_pool()
 
 # ===================== TELAS =====================
 
@@ -336,9 +359,9 @@ elif st.session_state.modo == 'admin' and st.session_state.admin_logado:
             st.session_state.modo = 'selecao'
             st.rerun()
     with colB:
-        if st.button("🗑️ Resetar Oficina (Apagar Todos os Dados)", type="secondary"):
+        if st.button("🗑️ Resetar Oficina (Arquivar e Começar do Zero)", type="secondary"):
             if resetar_banco_db():
-                st.success("✅ Oficina resetada com sucesso!")
+                st.success("✅ Oficina arquivada; nova oficina iniciada!")
                 st.rerun()
     
     st.markdown("---")
@@ -374,7 +397,7 @@ elif st.session_state.modo == 'admin' and st.session_state.admin_logado:
                 if p['descricao']:
                     st.write(f"**Descrição:** {p['descricao']}")
                 st.write(f"**Cadastrado em:** {p['timestamp']}")
-                st.write(f"**ID:** {p['id']}")
+                st.write(f"**ID:** {p['codigo']}")
                 
                 if st.button("🗑️ Remover", key=f"rm{i}", type="secondary"): 
                     if remover_problema_db(p['id']):
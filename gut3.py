@@ -1,9 +1,37 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import sqlite3
+import csv
+import glob
+import io
+import os
+import unicodedata
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime
 import numpy as np
+from openpyxl import Workbook, load_workbook
+
+from banco_gut import (
+    COLUNAS_HISTOGRAMA, PRAGMAS_CONEXAO, PoolConexoes, abrir_pool, verificar_planos_consultas,
+    SQL_INSERIR_PARTICIPANTE, SQL_INSERIR_VOTO, SQL_LISTAR_PROBLEMAS, SQL_VOTOS_PARTICIPANTE,
+    SQL_HISTOGRAMAS, SQL_ESTATISTICAS_GERAIS, SQL_DISTRIBUICAO_VOTOS,
+    SQL_REMOVER_VOTOS_PROBLEMA, SQL_MATRIZ_VOTOS, SQL_PARTICIPANTES_ATIVOS,
+    SQL_EVENTO_NO_MOMENTO, SQL_SNAPSHOT_ANTERIOR, SQL_RESUMO_HISTORICO, SQL_ULTIMOS_EVENTOS,
+    SQL_EVENTOS_INTERVALO, SQL_VOTOS_DESDE, SQL_LINHA_DO_TEMPO,
+    arquivar_banco_legado, nome_arquivo_oficina,
+)
+
+try:  # Parquet é opcional: só aparece na exportação se o pyarrow estiver instalado
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 st.set_page_config(
     page_title="Matriz GUT 2.0 - Votação Colaborativa",
@@ -66,237 +94,1380 @@ st.markdown("""
 # ===================== BANCO DE DADOS =====================
 DATABASE_FILE = 'matriz_gut.db'
 
-def init_database():
-    """Inicializa o banco de dados SQLite"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    # Tabela de problemas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS problemas (
-            id TEXT PRIMARY KEY,
-            nome TEXT NOT NULL,
-            descricao TEXT,
-            timestamp TEXT
-        )
-    ''')
+# Cada oficina tem seu próprio arquivo de banco. O ponteiro guarda o nome do arquivo da
+# oficina em andamento dentro de DIRETORIO_OFICINAS; sem ponteiro vale DATABASE_FILE.
+DIRETORIO_OFICINAS = 'oficinas'
+PONTEIRO_OFICINA_ATUAL = os.path.join(DIRETORIO_OFICINAS, 'ATUAL')
+
+def banco_atual():
+    """Caminho do banco da oficina em andamento.
     
-    # Tabela de votos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS votos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            problema_id TEXT,
-            participante TEXT,
-            gravidade INTEGER,
-            urgencia INTEGER,
-            tendencia INTEGER,
-            timestamp TEXT,
-            UNIQUE(problema_id, participante),
-            FOREIGN KEY (problema_id) REFERENCES problemas (id)
-        )
-    ''')
+    Todo processo passa por aqui: quando o ponteiro muda (reset feito por este ou por outro
+    processo), os recursos deste processo no banco anterior são liberados em segundo plano.
+    """
+    try:
+        with open(PONTEIRO_OFICINA_ATUAL, encoding='utf-8') as f:
+            caminho = os.path.join(DIRETORIO_OFICINAS, f.read().strip())
+    except FileNotFoundError:
+        caminho = DATABASE_FILE
+    liberar_bancos_anteriores(caminho)
+    return caminho
+
+class RecursosAbertos:
+    """Recursos em cache (pool, fila, backup, observador) já criados neste processo, por banco"""
     
-    conn.commit()
-    conn.close()
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._por_banco = {}
+        self._agendados = set()
+    
+    def registrar(self, caminho, nome):
+        with self.lock:
+            self._por_banco.setdefault(caminho, set()).add(nome)
+    
+    def retirar(self, caminho):
+        """Nomes dos recursos criados para `caminho`, que sai do registro"""
+        with self.lock:
+            self._agendados.discard(caminho)
+            return self._por_banco.pop(caminho, set())
+    
+    def agendar_anteriores(self, atual):
+        """Bancos com recursos abertos que deixaram de ser o atual (cada um é devolvido uma vez)"""
+        with self.lock:
+            anteriores = [c for c in self._por_banco if c != atual and c not in self._agendados]
+            self._agendados.update(anteriores)
+            return anteriores
+
+@st.cache_resource
+def registro_recursos():
+    """Registro único por processo dos recursos abertos (ver liberar_recursos_banco)"""
+    return RecursosAbertos()
+
+@st.cache_resource
+def criar_pool(caminho):
+    """Pool único por processo para o arquivo `caminho` (sobrevive a reruns e é
+    compartilhado entre sessões).
+    
+    Na criação aplica as migrações pendentes; reruns seguintes não executam DDL.
+    """
+    pool = abrir_pool(caminho)
+    registro_recursos().registrar(caminho, "pool")
+    return pool
+
+def obter_pool():
+    """Pool do banco da oficina em andamento"""
+    return criar_pool(banco_atual())
 
 def get_db_connection():
-    """Retorna conexão com o banco"""
-    return sqlite3.connect(DATABASE_FILE)
+    """Retorna conexão do pool (usar com `with get_db_connection() as conn:`)"""
+    return obter_pool().conexao()
+
+# ===================== FILA DE ESCRITA DE VOTOS =====================
+# Uma única thread escritora agrupa os votos que chegam em poucos milissegundos numa
+# só transação (group commit): um fsync por lote em vez de um por voto.
+JANELA_LOTE_S = 0.005        # tempo máximo que o primeiro voto espera por companhia
+MAX_ENVIOS_POR_LOTE = 500
+MAX_TENTATIVAS_ESCRITA = 8   # tentativas em SQLITE_BUSY antes de desistir
+TIMEOUT_VOTO_S = 15
+INTERVALO_SNAPSHOT_VOTOS = 5000  # votos gravados entre dois snapshots do histograma
+
+def _erro_de_lock(erro):
+    """True se o erro do SQLite indica banco ocupado/travado (vale tentar de novo)"""
+    mensagem = str(erro).lower()
+    return isinstance(erro, sqlite3.OperationalError) and ("locked" in mensagem or "busy" in mensagem)
+
+class FilaEscritaVotos:
+    """Fila em processo com thread escritora dedicada e commit em grupo"""
+    
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._pendentes = queue.Queue()
+        self._votos_desde_snapshot = 0
+        self._parada = False
+        self._thread = threading.Thread(target=self._executar, name="escritor-votos", daemon=True)
+        self._thread.start()
+    
+    def enviar(self, votos):
+        """Enfileira uma lista de votos, gravados juntos na mesma transação.
+        
+        Cada voto é uma tupla (problema_id, nome_participante, g, u, t, criado_em).
+        Retorna um Future que resolve com o número de votos gravados ou com o erro.
+        """
+        if self._parada:
+            raise RuntimeError("fila de votos encerrada: a oficina foi encerrada")
+        futuro = Future()
+        self._pendentes.put((list(votos), futuro))
+        return futuro
+    
+    def parar(self):
+        """Grava o que já está na fila e encerra a thread escritora e sua conexão"""
+        self._parada = True
+        self._pendentes.put(None)
+        self._thread.join()
+    
+    def _executar(self):
+        conn = sqlite3.connect(self.caminho, timeout=5, cached_statements=256)
+        for pragma in PRAGMAS_CONEXAO:
+            conn.execute(pragma)
+        
+        encerrar = False
+        while not encerrar:
+            lote = [self._pendentes.get()]
+            prazo = time.monotonic() + JANELA_LOTE_S
+            while lote[-1] is not None and len(lote) < MAX_ENVIOS_POR_LOTE:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._pendentes.get(timeout=restante))
+                except queue.Empty:
+                    break
+            
+            # None (de parar) fecha o último lote
+            if lote[-1] is None:
+                encerrar = True
+                lote.pop()
+            
+            try:
+                self._gravar([votos for votos, _ in lote], conn)
+                for votos, futuro in lote:
+                    futuro.set_result(len(votos))
+                    self._votos_desde_snapshot += len(votos)
+            except Exception:
+                # Um envio inválido não pode derrubar o lote inteiro: grava um por um
+                for votos, futuro in lote:
+                    try:
+                        self._gravar([votos], conn)
+                        futuro.set_result(len(votos))
+                        self._votos_desde_snapshot += len(votos)
+                    except Exception as e:
+                        futuro.set_exception(e)
+            
+            # Snapshot periódico do histograma, fora do caminho de quem está votando
+            if self._votos_desde_snapshot >= INTERVALO_SNAPSHOT_VOTOS:
+                try:
+                    registrar_snapshot(conn)
+                    self._votos_desde_snapshot = 0
+                except Exception:
+                    if conn.in_transaction:
+                        conn.rollback()
+        conn.close()
+    
+    def _gravar(self, envios, conn):
+        """Grava os envios numa transação, repetindo com backoff exponencial se o banco estiver ocupado"""
+        for tentativa in range(MAX_TENTATIVAS_ESCRITA):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for votos in envios:
+                    conn.executemany(SQL_INSERIR_PARTICIPANTE, {(v[1],) for v in votos})
+                    conn.executemany(SQL_INSERIR_VOTO, votos)
+                conn.commit()
+                return
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if not _erro_de_lock(e) or tentativa == MAX_TENTATIVAS_ESCRITA - 1:
+                    raise
+                time.sleep(0.01 * 2 ** tentativa * (1 + random.random()))
+
+@st.cache_resource
+def criar_fila_votos(caminho):
+    """Fila de escrita única por processo para o arquivo `caminho`"""
+    criar_pool(caminho)  # garante o esquema migrado antes da primeira escrita
+    fila = FilaEscritaVotos(caminho)
+    registro_recursos().registrar(caminho, "fila")
+    return fila
+
+def obter_fila_votos():
+    """Fila de escrita do banco da oficina em andamento"""
+    return criar_fila_votos(banco_atual())
 
 def gerar_id_problema(nome):
-    """Gera ID único para o problema"""
+    """Gera o código único do problema (hash do nome; evita cadastros duplicados)"""
     import hashlib
     return hashlib.md5(nome.encode()).hexdigest()[:12]
 
 def adicionar_problema_db(nome, descricao=""):
     """Adiciona problema no banco de dados"""
-    pid = gerar_id_problema(nome)
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    codigo = gerar_id_problema(nome)
+    criado_em = int(time.time())
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
-            INSERT OR REPLACE INTO problemas (id, nome, descricao, timestamp)
-            VALUES (?, ?, ?, ?)
-        ''', (pid, nome, descricao, timestamp))
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao adicionar problema: {e}")
-        return False
-    finally:
-        conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT INTO problemas (codigo, nome, descricao, criado_em)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (codigo) DO UPDATE SET
+                    nome = excluded.nome, descricao = excluded.descricao, criado_em = excluded.criado_em
+            ''', (codigo, nome, descricao, criado_em))
+            conn.commit()
+            return True
+        except Exception as e:
+            st.error(f"Erro ao adicionar problema: {e}")
+            return False
 
 def listar_problemas_db():
     """Lista todos os problemas do banco"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT id, nome, descricao, timestamp FROM problemas ORDER BY timestamp')
-    problemas = cursor.fetchall()
-    conn.close()
-    
-    return [{"id": p[0], "nome": p[1], "descricao": p[2], "timestamp": p[3]} for p in problemas]
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(SQL_LISTAR_PROBLEMAS)
+        problemas = cursor.fetchall()
+        
+        return [
+            {"id": p[0], "codigo": p[1], "nome": p[2], "descricao": p[3],
+             "timestamp": datetime.fromtimestamp(p[4]).strftime('%Y-%m-%d %H:%M:%S')}
+            for p in problemas
+        ]
 
 def remover_problema_db(problema_id):
     """Remove problema e seus votos do banco"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        try:
+            # Remove votos do problema e seu histograma
+            cursor.execute(SQL_REMOVER_VOTOS_PROBLEMA, (problema_id,))
+            cursor.execute('DELETE FROM histograma_votos WHERE problema_id = ?', (problema_id,))
+            # Remove o problema
+            cursor.execute('DELETE FROM problemas WHERE id = ?', (problema_id,))
+            conn.commit()
+            return True
+        except Exception as e:
+            st.error(f"Erro ao remover problema: {e}")
+            return False
+
+def votar_problema_db(problema_id, participante, gravidade, urgencia, tendencia):
+    """Registra ou atualiza voto no banco"""
+    if not all(nota in range(1, 6) for nota in (gravidade, urgencia, tendencia)):
+        st.error("Erro ao registrar voto: as notas devem ser inteiros de 1 a 5")
+        return False
+    
+    criado_em = int(time.time())
     
     try:
-        # Remove votos do problema
-        cursor.execute('DELETE FROM votos WHERE problema_id = ?', (problema_id,))
-        # Remove o problema
-        cursor.execute('DELETE FROM problemas WHERE id = ?', (problema_id,))
-        conn.commit()
+        futuro = obter_fila_votos().enviar([(problema_id, participante, gravidade, urgencia, tendencia, criado_em)])
+        futuro.result(timeout=TIMEOUT_VOTO_S)
         return True
     except Exception as e:
-        st.error(f"Erro ao remover problema: {e}")
+        st.error(f"Erro ao registrar voto: {e}")
         return False
-    finally:
-        conn.close()
 
-def votar_problema_db(problema_id, participante, gravidade, urgencia, tendencia):
-    """Registra ou atualiza voto no banco"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+def votar_varios_problemas_db(participante, votos):
+    """Registra vários votos do participante em uma única transação.
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    `votos` é um dicionário {problema_id: (gravidade, urgencia, tendencia)}.
+    """
+    if not all(nota in range(1, 6) for notas in votos.values() for nota in notas):
+        st.error("Erro ao registrar votos: as notas devem ser inteiros de 1 a 5")
+        return False
+    
+    criado_em = int(time.time())
+    linhas = [(problema_id, participante, g, u, t, criado_em) for problema_id, (g, u, t) in votos.items()]
     
     try:
-        cursor.execute('''
-            INSERT OR REPLACE INTO votos 
-            (problema_id, participante, gravidade, urgencia, tendencia, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (problema_id, participante, gravidade, urgencia, tendencia, timestamp))
-        conn.commit()
+        # Um único envio para a fila = todos os votos na mesma transação
+        obter_fila_votos().enviar(linhas).result(timeout=TIMEOUT_VOTO_S)
         return True
     except Exception as e:
-        st.error(f"Erro ao registrar voto: {e}")
+        st.error(f"Erro ao registrar votos: {e}")
         return False
+
+def obter_votos_participante_db(participante):
+    """Obtém todos os votos de um participante em uma consulta: {problema_id: voto}"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(SQL_VOTOS_PARTICIPANTE, (participante,))
+        
+        return {v[0]: {"gravidade": v[1], "urgencia": v[2], "tendencia": v[3]} for v in cursor.fetchall()}
+
+def avaliar_consenso(std_val):
+    """Classifica o consenso de um critério (menor desvio = maior consenso)"""
+    if std_val <= 0.8: return "Alto"
+    elif std_val <= 1.5: return "Médio"
+    else: return "Baixo"
+
+def montar_estatisticas(total, sg, su, st, sg2, su2, st2):
+    """Monta o dicionário de estatísticas a partir de contagem, somas e somas dos quadrados"""
+    # Médias
+    mg = sg / total
+    mu = su / total
+    mt = st / total
+    
+    # Desvios padrão populacionais: sqrt(E[x²] - E[x]²)
+    std_g = np.sqrt(max(sg2 / total - mg ** 2, 0)) if total > 1 else 0
+    std_u = np.sqrt(max(su2 / total - mu ** 2, 0)) if total > 1 else 0
+    std_t = np.sqrt(max(st2 / total - mt ** 2, 0)) if total > 1 else 0
+    
+    # Pontuação GUT
+    gut_media = mg * mu * mt
+    
+    return {
+        "total": total,
+        "mg": round(mg, 2), "mu": round(mu, 2), "mt": round(mt, 2),
+        "sg": sg, "su": su, "st": st,
+        "std_g": round(std_g, 2), "std_u": round(std_u, 2), "std_t": round(std_t, 2),
+        "gut": round(gut_media, 2),
+        "consenso_g": avaliar_consenso(std_g),
+        "consenso_u": avaliar_consenso(std_u),
+        "consenso_t": avaliar_consenso(std_t)
+    }
+
+def mediana_histograma(contagens):
+    """Mediana a partir das contagens das notas 1 a 5 (média dos dois centrais se total par)"""
+    total = sum(contagens)
+    acumulado = np.cumsum(contagens)
+    # Nota na posição k (base 0) = primeira nota cujo acumulado ultrapassa k
+    baixo = int(np.searchsorted(acumulado, (total - 1) // 2, side='right')) + 1
+    alto = int(np.searchsorted(acumulado, total // 2, side='right')) + 1
+    return (baixo + alto) / 2
+
+def estatisticas_histograma(contagens):
+    """Estatísticas completas a partir dos 15 contadores (g1..g5, u1..u5, t1..t5), em O(1)"""
+    g, u, t = contagens[0:5], contagens[5:10], contagens[10:15]
+    total = sum(g)
+    if total == 0:
+        return None
+    
+    somas = [sum(n * c for n, c in enumerate(h, 1)) for h in (g, u, t)]
+    quadrados = [sum(n * n * c for n, c in enumerate(h, 1)) for h in (g, u, t)]
+    
+    stats = montar_estatisticas(total, *somas, *quadrados)
+    stats.update({"med_g": mediana_histograma(g), "med_u": mediana_histograma(u), "med_t": mediana_histograma(t)})
+    return stats
+
+def calcular_estatisticas_todos_db():
+    """Calcula as estatísticas de todos os problemas a partir do histograma materializado.
+    
+    O custo depende só do número de problemas, não do número de votos.
+    Retorna dicionário {problema_id: estatísticas}; problemas sem votos não aparecem.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(SQL_HISTOGRAMAS)
+        
+        linhas = cursor.fetchall()
+        
+        estatisticas = {}
+        for linha in linhas:
+            stats = estatisticas_histograma(linha[1:])
+            if stats:
+                estatisticas[linha[0]] = stats
+        return estatisticas
+
+def obter_estatisticas_db():
+    """Obtém estatísticas gerais do banco"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Problemas, votos e participantes únicos em uma consulta
+        cursor.execute(SQL_ESTATISTICAS_GERAIS)
+        total_problemas, total_votos, participantes_unicos = cursor.fetchone()
+        
+        return {
+            "problemas": total_problemas,
+            "votos": total_votos,
+            "participantes": participantes_unicos
+        }
+
+def obter_distribuicao_votos_db():
+    """Contagem de votos em cada nota (1 a 5) por critério: {"Gravidade": [n1, ..., n5], ...}"""
+    with get_db_connection() as conn:
+        contagens = conn.execute(SQL_DISTRIBUICAO_VOTOS).fetchone()
+        return {
+            criterio: list(contagens[i * 5:(i + 1) * 5])
+            for i, criterio in enumerate(["Gravidade", "Urgência", "Tendência"])
+        }
+
+def _posicoes(ids, procurados):
+    """Posição de cada valor de `procurados` no vetor `ids`; -1 se ausente"""
+    tabela = np.full(max(ids.max(initial=0), procurados.max(initial=0)) + 1, -1, dtype=np.int64)
+    tabela[ids] = np.arange(len(ids))
+    return tabela[procurados]
+
+def obter_matriz_votos_db():
+    """Todos os votos como matriz densa participante × problema.
+    
+    Retorna {"participantes": [nomes], "problema_ids": [...], "problemas": [nomes],
+    "notas": ndarray int8 (3, participantes, problemas)} com G, U e T; 0 = sem voto.
+    """
+    with get_db_connection() as conn:
+        # Uma transação de leitura: as três consultas enxergam o mesmo instante do banco
+        conn.execute('BEGIN')
+        votos = np.array(conn.execute(SQL_MATRIZ_VOTOS).fetchall(), dtype=np.int64).reshape(-1, 5)
+        participantes = conn.execute(SQL_PARTICIPANTES_ATIVOS).fetchall()
+        problemas = conn.execute(SQL_LISTAR_PROBLEMAS).fetchall()
+        conn.rollback()
+    
+    ids_participantes = np.array([p[0] for p in participantes], dtype=np.int64)
+    ids_problemas = np.array([p[0] for p in problemas], dtype=np.int64)
+    linhas = _posicoes(ids_participantes, votos[:, 0])
+    colunas = _posicoes(ids_problemas, votos[:, 1])
+    validos = (linhas >= 0) & (colunas >= 0)
+    
+    notas = np.zeros((3, len(participantes), len(problemas)), dtype=np.int8)
+    notas[:, linhas[validos], colunas[validos]] = votos[validos, 2:5].T
+    return {
+        "participantes": [p[1] for p in participantes],
+        "problema_ids": ids_problemas.tolist(),
+        "problemas": [p[2] for p in problemas],
+        "notas": notas,
+    }
+
+# Espera antes de selar a oficina encerrada: votos já a caminho terminam no banco antigo
+PRAZO_SELAGEM_S = 2
+
+def liberar_recursos_banco(caminho):
+    """Encerra as threads e fecha as conexões do processo ligadas ao banco `caminho` e as
+    tira do cache (senão o arquivo da oficina encerrada ficaria aberto para sempre).
+    
+    Só toca no que este processo já criou: nada é aberto apenas para ser fechado.
+    """
+    registro = registro_recursos()
+    with registro.lock:  # outra liberação do mesmo banco espera esta terminar
+        abertos = registro.retirar(caminho)
+        for nome, fabrica, encerrar in (
+            ("fila", criar_fila_votos, FilaEscritaVotos.parar),  # grava antes os votos da fila
+            ("backup", criar_servico_backup, ServicoBackup.parar),
+            ("observador", criar_observador_versao, ObservadorVersao.fechar),
+            ("pool", criar_pool, PoolConexoes.fechar),
+        ):
+            if nome in abertos:
+                encerrar(fabrica(caminho))
+                fabrica.clear(caminho)
+
+def _liberar_depois_do_prazo(caminho):
+    time.sleep(PRAZO_SELAGEM_S)
+    liberar_recursos_banco(caminho)
+
+def liberar_bancos_anteriores(atual):
+    """Agenda a liberação dos recursos deste processo em bancos que não são mais `atual`"""
+    for caminho in registro_recursos().agendar_anteriores(atual):
+        threading.Thread(
+            target=_liberar_depois_do_prazo, args=(caminho,), name="liberar-oficina", daemon=True
+        ).start()
+
+def selar_oficina(caminho):
+    """Compacta o banco de uma oficina encerrada e o deixa somente leitura"""
+    time.sleep(PRAZO_SELAGEM_S)
+    liberar_recursos_banco(caminho)
+    if caminho == DATABASE_FILE:
+        # O banco legado é versionado no git: sela-se uma cópia em DIRETORIO_OFICINAS
+        caminho = arquivar_banco_legado(caminho, DIRETORIO_OFICINAS)
+    conn = sqlite3.connect(caminho, timeout=30)
+    try:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+        # Em WAL o VACUUM vai para o log; o checkpoint leva as páginas compactadas ao arquivo
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
     finally:
         conn.close()
+    os.chmod(caminho, 0o444)
+    
+    # Cópia colunar para as consultas entre oficinas
+    arquivar_oficina_colunar(caminho)
+    atualizar_indice_oficinas()
+
+def resetar_banco_db():
+    """Encerra a oficina atual e começa outra com banco vazio.
+    
+    O banco novo é criado e migrado antes da troca, que é só a substituição atômica do
+    ponteiro da oficina atual (tempo constante, sem DELETE). O banco anterior é selado
+    em segundo plano e continua consultável (listar_oficinas_arquivadas).
+    """
+    anterior = banco_atual()
+    try:
+        os.makedirs(DIRETORIO_OFICINAS, exist_ok=True)
+        nome = nome_arquivo_oficina(datetime.now())
+        criar_pool(os.path.join(DIRETORIO_OFICINAS, nome))
+        temporario = PONTEIRO_OFICINA_ATUAL + '.novo'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(nome)
+        os.replace(temporario, PONTEIRO_OFICINA_ATUAL)
+    except Exception as e:
+        st.error(f"Erro ao resetar banco: {e}")
+        return False
+    
+    threading.Thread(target=selar_oficina, args=(anterior,), name="selar-oficina", daemon=True).start()
+    return True
+
+def listar_oficinas_arquivadas():
+    """Oficinas encerradas, da mais recente para a mais antiga.
+    
+    Cada item é {"arquivo", "encerrada_em", "problemas", "votos", "participantes"};
+    os bancos são abertos somente leitura.
+    """
+    atual = os.path.abspath(banco_atual())
+    caminhos = sorted(glob.glob(os.path.join(DIRETORIO_OFICINAS, 'oficina_*.db')), reverse=True)
+    
+    oficinas = []
+    for caminho in caminhos:
+        if os.path.abspath(caminho) == atual:
+            continue
+        conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+        try:
+            problemas, votos, participantes = conn.execute(SQL_ESTATISTICAS_GERAIS).fetchone()
+        except sqlite3.Error:  # arquivo de esquema antigo ou corrompido: lista sem totais
+            problemas = votos = participantes = None
+        finally:
+            conn.close()
+        oficinas.append({
+            "arquivo": caminho,
+            "encerrada_em": datetime.fromtimestamp(os.path.getmtime(caminho)).strftime('%Y-%m-%d %H:%M:%S'),
+            "problemas": problemas,
+            "votos": votos,
+            "participantes": participantes,
+        })
+    return oficinas
 
-def obter_voto_participante_db(problema_id, participante):
-    """Obtém voto específico de um participante para um problema"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# ---------- Histórico de votos (eventos + snapshots) ----------
+def registrar_snapshot(conn):
+    """Copia o histograma atual como snapshot, marcado com o último evento que ele inclui"""
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute(
+        'INSERT INTO snapshots_votos (evento_id, criado_em) SELECT COALESCE(MAX(id), 0), ? FROM eventos_votos',
+        (int(time.time()),)
+    )
+    conn.execute(f'''
+        INSERT INTO snapshots_histograma (snapshot_id, problema_id, {", ".join(COLUNAS_HISTOGRAMA)})
+        SELECT last_insert_rowid(), problema_id, {", ".join(COLUNAS_HISTOGRAMA)} FROM histograma_votos
+    ''')
+    conn.commit()
+
+def histogramas_no_momento_db(momento):
+    """Histogramas {problema_id: 15 contagens} como estavam no instante `momento` (epoch).
+    
+    Parte do último snapshot anterior ao momento e aplica só os eventos seguintes: cada
+    evento soma o voto novo (exceto remoções) e desconta o voto que substituiu ou removeu,
+    sem reprocessar o log inteiro.
+    """
+    with get_db_connection() as conn:
+        conn.execute('BEGIN')  # snapshot e eventos vistos no mesmo instante do banco
+        evento = conn.execute(SQL_EVENTO_NO_MOMENTO, (momento,)).fetchone()
+        if evento is None:
+            return {}
+        alvo = evento[0]
+        
+        base = conn.execute(SQL_SNAPSHOT_ANTERIOR, (alvo,)).fetchone()
+        snapshot_id, inicio = base if base else (None, 0)
+        linhas_base = conn.execute(
+            f'SELECT problema_id, {", ".join(COLUNAS_HISTOGRAMA)} FROM snapshots_histograma WHERE snapshot_id = ?',
+            (snapshot_id,)
+        ).fetchall()
+        eventos = np.array(conn.execute(SQL_EVENTOS_INTERVALO, (inicio, alvo)).fetchall(), dtype=float).reshape(-1, 8)
     
-    cursor.execute('''
-        SELECT gravidade, urgencia, tendencia FROM votos 
-        WHERE problema_id = ? AND participante = ?
-    ''', (problema_id, participante))
+    problemas = np.unique(np.concatenate([[l[0] for l in linhas_base], eventos[:, 0]]).astype(np.int64))
+    contagens = np.zeros((len(problemas), 15), dtype=np.int64)
+    if linhas_base:
+        base_ids = np.searchsorted(problemas, [l[0] for l in linhas_base])
+        contagens[base_ids] = [l[1:] for l in linhas_base]
     
-    voto = cursor.fetchone()
-    conn.close()
+    # Notas 1..5 do critério c ocupam as colunas c*5 .. c*5+4
+    linha = np.searchsorted(problemas, eventos[:, 0].astype(np.int64))
+    novo = eventos[:, 4] == 0
+    substituiu = ~np.isnan(eventos[:, 5])
+    for c in range(3):
+        np.add.at(contagens, (linha[novo], c * 5 + eventos[novo, 1 + c].astype(int) - 1), 1)
+        np.add.at(contagens, (linha[substituiu], c * 5 + eventos[substituiu, 5 + c].astype(int) - 1), -1)
     
-    if voto:
-        return {"gravidade": voto[0], "urgencia": voto[1], "tendencia": voto[2]}
-    return None
+    return {int(pid): contagens[i].tolist() for i, pid in enumerate(problemas) if contagens[i, :5].sum() > 0}
+
+def estatisticas_no_momento_db(momento):
+    """Estatísticas de cada problema no instante `momento` (mesmo formato de calcular_estatisticas_todos_db)"""
+    return {
+        problema_id: estatisticas_histograma(contagens)
+        for problema_id, contagens in histogramas_no_momento_db(momento).items()
+    }
 
-def calcular_estatisticas_completas_db(problema_id):
-    """Calcula estatísticas completas incluindo somatórios e dispersão"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def resumo_historico_db(limite=50):
+    """Totais do log de eventos e os `limite` eventos mais recentes"""
+    with get_db_connection() as conn:
+        total_eventos, total_snapshots, primeiro, ultimo = conn.execute(SQL_RESUMO_HISTORICO).fetchone()
+        ultimos = conn.execute(SQL_ULTIMOS_EVENTOS, (limite, limite)).fetchall()
+    return {
+        "eventos": total_eventos,
+        "snapshots": total_snapshots,
+        "primeiro": primeiro,
+        "ultimo": ultimo,
+        "ultimos": ultimos,
+    }
+
+# ---------- Linha do tempo da votação ----------
+# Larguras de faixa (s) candidatas; usa a menor que cabe em MAX_FAIXAS_LINHA_TEMPO
+LARGURAS_FAIXA_S = (10, 30, 60, 300, 900, 3600, 6 * 3600, 86400)
+MAX_FAIXAS_LINHA_TEMPO = 120
+TOP_K_ESTABILIDADE = 5
+
+def largura_faixa(inicio, fim):
+    """Menor largura de LARGURAS_FAIXA_S que divide [inicio, fim] em até MAX_FAIXAS_LINHA_TEMPO faixas"""
+    duracao = max(fim - inicio, 1)
+    return next(
+        (l for l in LARGURAS_FAIXA_S if duracao / l <= MAX_FAIXAS_LINHA_TEMPO),
+        -(-duracao // MAX_FAIXAS_LINHA_TEMPO)
+    )
+
+def votos_desde_db(momento):
+    """Votos (novos ou alterados) registrados depois de `momento` (epoch)"""
+    with get_db_connection() as conn:
+        return conn.execute(SQL_VOTOS_DESDE, (momento,)).fetchone()[0]
+
+def linha_do_tempo_db(inicio, fim, k=TOP_K_ESTABILIDADE):
+    """Chegada de votos, participação acumulada e top-k por faixa de tempo em (inicio, fim].
     
-    cursor.execute('''
-        SELECT gravidade, urgencia, tendencia FROM votos 
-        WHERE problema_id = ?
-    ''', (problema_id,))
+    O estado em `inicio` vem de histogramas_no_momento_db; os eventos da janela são
+    agrupados por faixa (bincount/np.add.at) e acumulados com cumsum, então o ranking de
+    cada faixa sai sem reconsultar o banco. A linha 0 dos arrays é o estado em `inicio`.
+    """
+    largura = largura_faixa(inicio, fim)
+    n_faixas = -(-(fim - inicio) // largura)
+    bordas = inicio + largura * np.arange(n_faixas + 1)
     
-    votos = cursor.fetchall()
-    conn.close()
+    base = histogramas_no_momento_db(inicio)
+    with get_db_connection() as conn:
+        eventos = np.array(conn.execute(SQL_LINHA_DO_TEMPO, (inicio, fim)).fetchall(), dtype=float).reshape(-1, 9)
     
-    if not votos:
-        return None
+    problemas = np.unique(np.concatenate([list(base), eventos[:, 1]]).astype(np.int64))
+    # Por faixa e problema: votantes, soma G, soma U, soma T
+    estado = np.zeros((n_faixas + 1, len(problemas), 4))
+    if base:
+        contagens = np.array(list(base.values()), dtype=float).reshape(-1, 3, 5)
+        linhas_base = np.searchsorted(problemas, list(base))
+        estado[0, linhas_base, 0] = contagens[:, 0].sum(axis=1)
+        estado[0, linhas_base, 1:] = contagens @ np.arange(1, 6)
     
-    # Separar critérios
-    g_values = [v[0] for v in votos]
-    u_values = [v[1] for v in votos]
-    t_values = [v[2] for v in votos]
+    # Faixa i cobre (bordas[i], bordas[i + 1]]
+    faixa = np.searchsorted(bordas, eventos[:, 0], side='left') - 1
+    linha = np.searchsorted(problemas, eventos[:, 1].astype(np.int64))
+    removido = eventos[:, 5] == 1
+    anterior = eventos[:, 6:9]
+    tinha_voto = ~np.isnan(anterior[:, 0])
+    # Votante entra no primeiro voto do par e sai quando o voto é removido
+    np.add.at(estado, (faixa + 1, linha, 0), (~removido & ~tinha_voto).astype(int) - (removido & tinha_voto))
+    for c in range(3):
+        np.add.at(estado, (faixa + 1, linha, 1 + c), eventos[:, 2 + c] * ~removido - np.nan_to_num(anterior[:, c]))
+    estado = np.cumsum(estado, axis=0)
     
-    # Calcular estatísticas
-    total_votos = len(votos)
+    votantes = estado[:, :, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gut = np.where(votantes > 0, np.prod(estado[:, :, 1:] / votantes[:, :, None], axis=2), -1)
+    ordem = np.argsort(-gut, axis=1, kind='stable')[:, :min(k, len(problemas))]
+    # Sem votos o problema não entra no ranking
+    top = np.where(np.take_along_axis(gut, ordem, axis=1) >= 0, problemas[ordem], -1)
     
-    # Médias
-    mg = np.mean(g_values)
-    mu = np.mean(u_values)
-    mt = np.mean(t_values)
+    mudancas = np.flatnonzero((top[1:] != top[:-1]).any(axis=1))
+    return {
+        "bordas": bordas,
+        "chegadas": np.bincount(faixa[~removido], minlength=n_faixas),
+        "problemas": problemas,
+        "votantes": votantes.astype(int),
+        "top": top,
+        # Fim da última faixa em que o top-k mudou (None: estável na janela toda)
+        "ultima_mudanca": int(bordas[mudancas[-1] + 1]) if len(mudancas) else None,
+    }
+
+# ===================== EXPORTAÇÃO DE VOTOS BRUTOS =====================
+# Exporta a tabela votos inteira (para auditoria) lendo do SQLite em lotes com fetchmany
+# e gravando cada lote direto no arquivo: a memória usada é a de um lote, não a da tabela.
+DIRETORIO_EXPORTACOES = "exportacoes"
+TAMANHO_LOTE_EXPORTACAO = 10_000
+# Acima disso o arquivo fica só no disco: o download do Streamlit carrega o arquivo inteiro na memória
+LIMITE_DOWNLOAD_MB = 200
+MAX_LINHAS_PLANILHA = 1_048_575  # limite do Excel menos a linha de cabeçalho
+
+# Em ordem de chave primária de votos: sem ordenação temporária
+SQL_EXPORTAR_VOTOS = '''
+    SELECT problemas.codigo, problemas.nome, participantes.nome,
+           votos.gravidade, votos.urgencia, votos.tendencia,
+           votos.gravidade * votos.urgencia * votos.tendencia, votos.criado_em
+    FROM votos
+    JOIN problemas ON problemas.id = votos.problema_id
+    JOIN participantes ON participantes.id = votos.participante_id
+    ORDER BY votos.problema_id, votos.participante_id
+'''
+COLUNAS_EXPORTACAO = ["codigo_problema", "problema", "participante",
+                      "gravidade", "urgencia", "tendencia", "gut", "votado_em"]
+
+def lotes_votos_brutos():
+    """Gera lotes (listas de tuplas) com todos os votos, de um mesmo instante do banco"""
+    with get_db_connection() as conn:
+        conn.execute('BEGIN')  # leitura consistente mesmo com votos chegando durante a exportação
+        cursor = conn.execute(SQL_EXPORTAR_VOTOS)
+        while True:
+            lote = cursor.fetchmany(TAMANHO_LOTE_EXPORTACAO)
+            if not lote:
+                break
+            yield lote
+        conn.rollback()
+
+def _formatar_data(epoch):
+    return datetime.fromtimestamp(epoch).strftime('%Y-%m-%d %H:%M:%S')
+
+def _gravar_csv(caminho):
+    linhas = 0
+    with open(caminho, "w", newline="", encoding="utf-8") as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(COLUNAS_EXPORTACAO)
+        for lote in lotes_votos_brutos():
+            escritor.writerows(linha[:-1] + (_formatar_data(linha[-1]),) for linha in lote)
+            linhas += len(lote)
+    return linhas
+
+def _gravar_excel(caminho):
+    # Modo write-only: as linhas vão para o arquivo e não ficam na memória
+    planilha = Workbook(write_only=True)
+    aba = None
+    linhas = 0
+    for lote in lotes_votos_brutos():
+        for linha in lote:
+            if linhas % MAX_LINHAS_PLANILHA == 0:
+                aba = planilha.create_sheet(f"Votos {linhas // MAX_LINHAS_PLANILHA + 1}")
+                aba.append(COLUNAS_EXPORTACAO)
+            aba.append(linha[:-1] + (datetime.fromtimestamp(linha[-1]),))
+            linhas += 1
+    if aba is None:
+        planilha.create_sheet("Votos 1").append(COLUNAS_EXPORTACAO)
+    planilha.save(caminho)
+    return linhas
+
+def _gravar_parquet(caminho):
+    esquema = pa.schema([
+        ("codigo_problema", pa.string()), ("problema", pa.string()), ("participante", pa.string()),
+        ("gravidade", pa.int8()), ("urgencia", pa.int8()), ("tendencia", pa.int8()),
+        # Epoch é um instante em UTC: com o fuso marcado, leitores convertem para a hora
+        # local e o valor bate com o CSV e o Excel (gravados em hora local)
+        ("gut", pa.int16()), ("votado_em", pa.timestamp("s", tz="UTC")),
+    ])
+    linhas = 0
+    with pq.ParquetWriter(caminho, esquema) as escritor:
+        for lote in lotes_votos_brutos():
+            colunas = list(zip(*lote))
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(coluna, type=campo.type) for coluna, campo in zip(colunas, esquema)],
+                schema=esquema
+            ))
+            linhas += len(lote)
+    return linhas
+
+FORMATOS_EXPORTACAO = {
+    "CSV": ("csv", "text/csv", _gravar_csv),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", _gravar_excel),
+}
+if pq is not None:
+    FORMATOS_EXPORTACAO["Parquet"] = ("parquet", "application/vnd.apache.parquet", _gravar_parquet)
+
+def exportar_votos_brutos(formato):
+    """Grava todos os votos em DIRETORIO_EXPORTACOES no formato pedido.
+    
+    Retorna (caminho, linhas). O arquivo é escrito num temporário e renomeado no fim,
+    então um arquivo com o nome final está sempre completo.
+    """
+    extensao, _, gravar = FORMATOS_EXPORTACAO[formato]
+    os.makedirs(DIRETORIO_EXPORTACOES, exist_ok=True)
+    caminho = os.path.join(DIRETORIO_EXPORTACOES, f"votos_brutos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extensao}")
+    temporario = caminho + ".parcial"
+    try:
+        linhas = gravar(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return caminho, linhas
+
+def ler_arquivo(caminho):
+    with open(caminho, "rb") as arquivo:
+        return arquivo.read()
+
+# ===================== IMPORTAÇÃO EM LOTE =====================
+# Planilhas (xlsx em modo read-only, linha a linha) ou CSV viram uma lista de linhas;
+# a gravação acontece numa única transação e a tela faz um só rerun no fim.
+COLUNAS_NOME_PROBLEMA = ("problema", "nome", "nome do problema")
+COLUNAS_DESCRICAO = ("descricao",)
+
+def _normalizar_cabecalho(valor):
+    texto = unicodedata.normalize("NFKD", str(valor or "").strip().lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+# Separador que não aparece em texto: a linha inteira vira um campo (aspas seguem valendo)
+SEPARADOR_COLUNA_UNICA = "\x1f"
+
+def _dialeto_csv(amostra, cabecalhos):
+    """Dialeto e separador do CSV: os do Sniffer, com o separador conferido contra o cabeçalho.
     
-    # Somatórios
-    sg = sum(g_values)
-    su = sum(u_values)
-    st = sum(t_values)
+    Exportações do Excel em pt-BR usam ';' sem aspas em vírgulas, e o Sniffer escolhe ','
+    numa lista de uma coluna com nomes como "Falta de servidores, sistemas lentos". Com um
+    cabeçalho de `cabecalhos` na primeira linha, vale o separador que o divide em colunas
+    reconhecidas; se nenhum divide, o arquivo tem uma coluna só.
+    """
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t")
+    except csv.Error:
+        dialeto = csv.excel
     
-    # Desvios padrão
-    std_g = np.std(g_values) if len(g_values) > 1 else 0
-    std_u = np.std(u_values) if len(u_values) > 1 else 0
-    std_t = np.std(t_values) if len(t_values) > 1 else 0
+    primeira = amostra.splitlines()[0] if amostra else ""
+    colunas = {s: next(csv.reader([primeira], dialeto, delimiter=s)) if primeira else [] for s in ",;\t"}
+    reconhecido = {s: any(_normalizar_cabecalho(c) in cabecalhos for c in colunas[s]) for s in colunas}
+    validos = [s for s in (dialeto.delimiter, ";", "\t", ",") if reconhecido[s] and len(colunas[s]) > 1]
+    if validos:
+        return dialeto, validos[0]
+    if any(reconhecido.values()):
+        return dialeto, SEPARADOR_COLUNA_UNICA
+    return dialeto, dialeto.delimiter
+
+def ler_linhas_arquivo(arquivo, nome_arquivo, cabecalhos=()):
+    """Linhas (tuplas de valores) da primeira aba de um .xlsx ou de um .csv.
     
-    # Pontuação GUT
-    gut_media = mg * mu * mt
+    `cabecalhos` são os nomes de coluna (normalizados) esperados na primeira linha; no CSV
+    servem para confirmar o separador (ver _dialeto_csv).
+    """
+    arquivo.seek(0)
+    if nome_arquivo.lower().endswith(".xlsx"):
+        planilha = load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            yield from planilha.worksheets[0].iter_rows(values_only=True)
+        finally:
+            planilha.close()
+    else:
+        texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+        try:
+            amostra = texto.read(4096)
+            texto.seek(0)
+            dialeto, separador = _dialeto_csv(amostra, cabecalhos)
+            yield from csv.reader(texto, dialeto, delimiter=separador)
+        finally:
+            texto.detach()  # não fechar o arquivo enviado junto com o wrapper
+
+def ler_problemas_arquivo(arquivo, nome_arquivo):
+    """Pares (nome, descrição) de uma planilha de problemas.
+    
+    A coluna do nome é reconhecida pelo cabeçalho (Problema/Nome) e a descrição é
+    opcional; sem cabeçalho reconhecido, a primeira coluna é o nome e a segunda a descrição.
+    """
+    linhas = ler_linhas_arquivo(arquivo, nome_arquivo, COLUNAS_NOME_PROBLEMA + COLUNAS_DESCRICAO)
+    primeira = next(linhas, None)
+    if primeira is None:
+        return []
+    
+    cabecalho = [_normalizar_cabecalho(v) for v in primeira]
+    col_nome = next((i for i, c in enumerate(cabecalho) if c in COLUNAS_NOME_PROBLEMA), None)
+    if col_nome is None:
+        col_nome, col_desc = 0, 1
+        linhas = [primeira, *linhas]
+    else:
+        col_desc = next((i for i, c in enumerate(cabecalho) if c in COLUNAS_DESCRICAO), None)
+    
+    problemas = []
+    for linha in linhas:
+        nome = linha[col_nome] if len(linha) > col_nome else None
+        descricao = linha[col_desc] if col_desc is not None and len(linha) > col_desc else None
+        problemas.append((
+            str(nome).strip() if nome is not None else "",
+            str(descricao).strip() if descricao is not None else ""
+        ))
+    return problemas
+
+def importar_problemas_db(problemas):
+    """Cadastra vários problemas de uma vez, numa única transação.
     
-    # Consenso (menor desvio = maior consenso)
-    def avaliar_consenso(std_val):
-        if std_val <= 0.8: return "Alto"
-        elif std_val <= 1.5: return "Médio"
-        else: return "Baixo"
+    Nomes vazios são ignorados e nomes repetidos (mesmo código de gerar_id_problema) contam
+    uma vez; problemas já cadastrados são mantidos como estão, com seus votos.
+    Retorna {"inseridos", "existentes", "duplicados", "vazios"} ou None em caso de erro.
+    """
+    vazios = sum(1 for nome, _ in problemas if not nome)
+    unicos = {}
+    for nome, descricao in problemas:
+        if nome:
+            unicos.setdefault(gerar_id_problema(nome), (nome, descricao))
+    criado_em = int(time.time())
     
-    consenso_g = avaliar_consenso(std_g)
-    consenso_u = avaliar_consenso(std_u)
-    consenso_t = avaliar_consenso(std_t)
+    with get_db_connection() as conn:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            antes = conn.total_changes
+            conn.executemany(
+                'INSERT INTO problemas (codigo, nome, descricao, criado_em) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (codigo) DO NOTHING',
+                [(codigo, nome, descricao, criado_em) for codigo, (nome, descricao) in unicos.items()]
+            )
+            inseridos = conn.total_changes - antes
+            conn.commit()
+        except Exception as e:
+            st.error(f"Erro ao importar problemas: {e}")
+            return None
     
     return {
-        "total": total_votos,
-        "mg": round(mg, 2), "mu": round(mu, 2), "mt": round(mt, 2),
-        "sg": sg, "su": su, "st": st,
-        "std_g": round(std_g, 2), "std_u": round(std_u, 2), "std_t": round(std_t, 2),
-        "gut": round(gut_media, 2),
-        "consenso_g": consenso_g, "consenso_u": consenso_u, "consenso_t": consenso_t
+        "inseridos": inseridos,
+        "existentes": len(unicos) - inseridos,
+        "duplicados": len(problemas) - vazios - len(unicos),
+        "vazios": vazios,
     }
 
-def obter_estatisticas_db():
-    """Obtém estatísticas gerais do banco"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# Cédulas de papel digitadas em planilha: uma linha por voto (problema, participante, G, U, T).
+# Validação vetorizada com pandas/NumPy; linhas inválidas são separadas com o motivo e as
+# válidas seguem pela fila de escrita em lotes grandes (mesma semântica de substituição).
+COLUNAS_ARQUIVO_VOTOS = {
+    "problema": ("problema", "nome do problema", "codigo", "codigo do problema"),
+    "participante": ("participante", "nome", "matricula", "nome ou matricula"),
+    "gravidade": ("gravidade", "g"),
+    "urgencia": ("urgencia", "u"),
+    "tendencia": ("tendencia", "t"),
+}
+LOTE_IMPORTACAO_VOTOS = 20_000
+TIMEOUT_IMPORTACAO_S = 120
+MAX_REJEITADOS_EXIBIDOS = 200
+
+def ler_votos_arquivo(arquivo, nome_arquivo):
+    """DataFrame (problema, participante, gravidade, urgencia, tendencia, linha) de uma planilha de cédulas.
+    
+    `linha` é o número da linha no arquivo, para o relatório de rejeitados.
+    Levanta ValueError se alguma coluna obrigatória não for encontrada no cabeçalho.
+    """
+    linhas = ler_linhas_arquivo(arquivo, nome_arquivo, [n for nomes in COLUNAS_ARQUIVO_VOTOS.values() for n in nomes])
+    cabecalho = [_normalizar_cabecalho(v) for v in next(linhas, ())]
+    posicoes = {
+        coluna: next((i for i, c in enumerate(cabecalho) if c in nomes), None)
+        for coluna, nomes in COLUNAS_ARQUIVO_VOTOS.items()
+    }
+    faltando = [coluna for coluna, i in posicoes.items() if i is None]
+    if faltando:
+        raise ValueError(f"colunas não encontradas no cabeçalho: {', '.join(faltando)}")
+    
+    dados = pd.DataFrame(list(linhas))
+    df = pd.DataFrame({
+        coluna: dados[i] if i in dados.columns else pd.Series(index=dados.index, dtype=object)
+        for coluna, i in posicoes.items()
+    })
+    df["linha"] = np.arange(len(df)) + 2
+    # Linhas totalmente em branco (comuns no fim das planilhas) não são votos nem erros
+    em_branco = (df.drop(columns="linha").astype("string").apply(lambda c: c.str.strip()).fillna("") == "").all(axis=1)
+    return df[~em_branco]
+
+def mapa_codigos_problemas_db():
+    """{codigo: id} de todos os problemas cadastrados"""
+    with get_db_connection() as conn:
+        return dict(conn.execute('SELECT codigo, id FROM problemas'))
+
+def validar_votos(df, codigos):
+    """Separa as linhas válidas das rejeitadas.
+    
+    O problema é reconhecido pelo nome (via gerar_id_problema) ou pelo próprio código.
+    Retorna (válidos, rejeitados): válidos com problema_id, participante e as três notas
+    (int); rejeitados com as colunas originais e o motivo.
+    """
+    problema = df["problema"].astype("string").str.strip()
+    participante = df["participante"].astype("string").str.strip()
     
-    # Total de problemas
-    cursor.execute('SELECT COUNT(*) FROM problemas')
-    total_problemas = cursor.fetchone()[0]
+    # gerar_id_problema roda uma vez por nome distinto, não por linha
+    posicao, nomes = pd.factorize(problema)
+    ids_nomes = np.array([codigos.get(gerar_id_problema(nome), codigos.get(nome, -1)) for nome in nomes] + [-1])
+    problema_id = ids_nomes[posicao]  # posicao == -1 (vazio) cai no -1 final
     
-    # Total de votos
-    cursor.execute('SELECT COUNT(*) FROM votos')
-    total_votos = cursor.fetchone()[0]
+    notas = df[["gravidade", "urgencia", "tendencia"]].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    notas_validas = ((notas >= 1) & (notas <= 5) & (notas == np.floor(notas))).all(axis=1)
     
-    # Participantes únicos
-    cursor.execute('SELECT COUNT(DISTINCT participante) FROM votos')
-    participantes_unicos = cursor.fetchone()[0]
+    # Máscaras "boolean" anuláveis viram object em pandas < 2.2 sem o dtype explícito
+    sem_problema = problema.isna() | (problema == "")
+    sem_participante = (participante.isna() | (participante == "")).to_numpy(dtype=bool)
+    motivo = np.select(
+        [sem_problema.to_numpy(dtype=bool), problema_id < 0, sem_participante, ~notas_validas],
+        ["problema vazio", "problema não cadastrado", "participante vazio", "notas devem ser inteiros de 1 a 5"],
+        default=""
+    )
+    validas = motivo == ""
     
-    conn.close()
+    validos = pd.DataFrame({
+        "problema_id": problema_id[validas],
+        "participante": participante[validas].to_numpy(dtype=object),
+        "gravidade": notas[validas, 0].astype(int),
+        "urgencia": notas[validas, 1].astype(int),
+        "tendencia": notas[validas, 2].astype(int),
+    })
+    rejeitados = df.loc[~validas, ["linha", "problema", "participante", "gravidade", "urgencia", "tendencia"]].copy()
+    rejeitados["motivo"] = motivo[~validas]
+    return validos, rejeitados
+
+def importar_votos_db(validos):
+    """Grava os votos válidos pela fila de escrita, em lotes de LOTE_IMPORTACAO_VOTOS.
+    
+    Como em votar_problema_db, um novo voto do mesmo participante no mesmo problema
+    substitui o anterior; dentro do arquivo vale a última linha.
+    Retorna {"gravados", "substituidos_no_arquivo", "falhas"}.
+    """
+    unicos = validos.drop_duplicates(["problema_id", "participante"], keep="last")
+    criado_em = int(time.time())
+    linhas = [
+        (int(pid), nome, int(g), int(u), int(t), criado_em)
+        for pid, nome, g, u, t in unicos.itertuples(index=False, name=None)
+    ]
+    
+    fila = obter_fila_votos()
+    envios = [
+        (len(linhas[i:i + LOTE_IMPORTACAO_VOTOS]), fila.enviar(linhas[i:i + LOTE_IMPORTACAO_VOTOS]))
+        for i in range(0, len(linhas), LOTE_IMPORTACAO_VOTOS)
+    ]
+    gravados = falhas = 0
+    for tamanho, futuro in envios:
+        try:
+            gravados += futuro.result(timeout=TIMEOUT_IMPORTACAO_S)
+        except Exception as e:
+            falhas += tamanho
+            st.error(f"Erro ao gravar lote de {tamanho} votos: {e}")
     
     return {
-        "problemas": total_problemas,
-        "votos": total_votos,
-        "participantes": participantes_unicos
+        "gravados": gravados,
+        "substituidos_no_arquivo": len(validos) - len(unicos),
+        "falhas": falhas,
     }
 
-def resetar_banco_db():
-    """Reseta completamente o banco de dados"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# ===================== BACKUP ONLINE =====================
+# Cópias consistentes do banco com a API de backup do SQLite, numa thread de fundo e em
+# passos de poucas páginas: entre um passo e outro os votos continuam sendo gravados.
+# Roda a cada INTERVALO_BACKUP_S (só se algo mudou) ou quando o admin pede; mantém as
+# MAX_BACKUPS cópias mais recentes em DIRETORIO_BACKUPS.
+DIRETORIO_BACKUPS = "backups"
+MAX_BACKUPS = 10
+INTERVALO_BACKUP_S = 15 * 60
+PAGINAS_POR_PASSO = 64
+PAUSA_ENTRE_PASSOS_S = 0.005
+# Escritas de outras conexões reiniciam a cópia incremental; depois de tantos reinícios
+# a cópia é feita num passo só (em WAL é um snapshot de leitura, que não bloqueia votos)
+MAX_REINICIOS_BACKUP = 5
+
+class CopiaReiniciada(Exception):
+    """A cópia incremental recomeçou vezes demais por causa de escritas concorrentes"""
+
+class ServicoBackup:
+    """Thread de fundo que faz e rotaciona os backups do banco"""
+    
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._pedido = threading.Event()
+        self._lock = threading.Lock()
+        self._estado = {"em_andamento": False, "ultimo": None, "erro": None}
+        self._versao_copiada = None
+        self._parado = False
+        self._thread = threading.Thread(target=self._executar, name="backup", daemon=True)
+        self._thread.start()
+    
+    def solicitar(self):
+        """Pede um backup imediato (mesmo sem mudanças desde o último)"""
+        self._pedido.set()
+    
+    def parar(self):
+        """Encerra a thread (depois do backup em andamento, se houver) e fecha a conexão"""
+        self._parado = True
+        self._pedido.set()
+        self._thread.join()
+    
+    def estado(self):
+        with self._lock:
+            return dict(self._estado)
+    
+    def _atualizar(self, **valores):
+        with self._lock:
+            self._estado.update(valores)
+    
+    def _executar(self):
+        origem = sqlite3.connect(self.caminho, check_same_thread=False)
+        while True:
+            manual = self._pedido.wait(timeout=INTERVALO_BACKUP_S)
+            self._pedido.clear()
+            if self._parado:
+                origem.close()
+                return
+            
+            # data_version desta conexão muda a cada escrita de outra conexão
+            versao = origem.execute('PRAGMA data_version').fetchone()[0]
+            if not manual and versao == self._versao_copiada:
+                continue
+            
+            self._atualizar(em_andamento=True, erro=None)
+            try:
+                caminho = self._copiar(origem)
+                self._versao_copiada = versao
+                self._atualizar(ultimo=(caminho, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                self._rotacionar()
+            except Exception as e:
+                self._atualizar(erro=str(e))
+            finally:
+                self._atualizar(em_andamento=False)
+    
+    def _copiar(self, origem):
+        """Copia o banco para um arquivo novo em DIRETORIO_BACKUPS e retorna o caminho"""
+        os.makedirs(DIRETORIO_BACKUPS, exist_ok=True)
+        base = os.path.splitext(os.path.basename(self.caminho))[0]
+        caminho = os.path.join(DIRETORIO_BACKUPS, f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.db")
+        temporario = caminho + ".parcial"
+        
+        reinicios = [0, None]  # quantidade, páginas restantes no passo anterior
+        def progresso(status, restantes, total):
+            if reinicios[1] is not None and restantes > reinicios[1]:
+                reinicios[0] += 1
+                if reinicios[0] > MAX_REINICIOS_BACKUP:
+                    raise CopiaReiniciada()
+            reinicios[1] = restantes
+        
+        try:
+            destino = sqlite3.connect(temporario)
+            try:
+                try:
+                    origem.backup(destino, pages=PAGINAS_POR_PASSO, progress=progresso, sleep=PAUSA_ENTRE_PASSOS_S)
+                except CopiaReiniciada:
+                    origem.backup(destino, pages=-1)
+            finally:
+                destino.close()
+            os.replace(temporario, caminho)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+        return caminho
     
+    def _rotacionar(self):
+        """Apaga os backups mais antigos além de MAX_BACKUPS"""
+        for antigo in listar_backups()[MAX_BACKUPS:]:
+            os.remove(antigo)
+
+def listar_backups():
+    """Arquivos de backup (de todas as oficinas), do mais recente para o mais antigo"""
+    return sorted(glob.glob(os.path.join(DIRETORIO_BACKUPS, "*.db")), key=os.path.getmtime, reverse=True)
+
+@st.cache_resource
+def criar_servico_backup(caminho):
+    """Serviço de backup único por processo para o arquivo `caminho`"""
+    criar_pool(caminho)  # garante o banco criado e migrado
+    servico = ServicoBackup(caminho)
+    registro_recursos().registrar(caminho, "backup")
+    return servico
+
+def obter_servico_backup():
+    """Serviço de backup do banco da oficina em andamento"""
+    return criar_servico_backup(banco_atual())
+
+# ===================== ARQUIVO COLUNAR DAS OFICINAS =====================
+# Cada oficina encerrada vira um .npz comprimido (uma coluna por array) e um índice único
+# guarda, por oficina e problema, votos, pontuação e posição no ranking. Consultas entre
+# oficinas (ex.: evolução de um problema) leem só as colunas do índice, sem abrir SQLite.
+DIRETORIO_ARQUIVO_COLUNAR = os.path.join(DIRETORIO_OFICINAS, 'colunar')
+INDICE_OFICINAS = os.path.join(DIRETORIO_ARQUIVO_COLUNAR, 'indice.npz')
+
+def _salvar_npz(caminho, **colunas):
+    """np.savez_compressed com troca atômica do arquivo"""
+    temporario = caminho + '.parcial'
+    with open(temporario, 'wb') as f:
+        np.savez_compressed(f, **colunas)
+    os.replace(temporario, caminho)
+
+def caminho_colunar(caminho_banco):
+    nome = os.path.splitext(os.path.basename(caminho_banco))[0]
+    return os.path.join(DIRETORIO_ARQUIVO_COLUNAR, f"{nome}.npz")
+
+def arquivar_oficina_colunar(caminho_banco):
+    """Converte o banco de uma oficina encerrada para o formato colunar e retorna o caminho do .npz.
+    
+    Colunas por voto: problema, participante (índices), gravidade, urgencia, tendencia, criado_em.
+    Colunas por problema: codigo, nome, votos, media_g/u/t, gut e posicao (1 = maior pontuação).
+    """
+    conn = sqlite3.connect(f"file:{caminho_banco}?mode=ro", uri=True)
     try:
-        cursor.execute('DELETE FROM votos')
-        cursor.execute('DELETE FROM problemas')
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao resetar banco: {e}")
-        return False
+        problemas = conn.execute('SELECT id, codigo, nome FROM problemas ORDER BY criado_em').fetchall()
+        participantes = conn.execute('SELECT id, nome FROM participantes ORDER BY id').fetchall()
+        votos = np.array(conn.execute(
+            'SELECT problema_id, participante_id, gravidade, urgencia, tendencia, criado_em FROM votos'
+        ).fetchall(), dtype=np.int64).reshape(-1, 6)
     finally:
         conn.close()
+    
+    problema = _posicoes(np.array([p[0] for p in problemas], dtype=np.int64), votos[:, 0])
+    participante = _posicoes(np.array([p[0] for p in participantes], dtype=np.int64), votos[:, 1])
+    validos = (problema >= 0) & (participante >= 0)
+    votos, problema, participante = votos[validos], problema[validos], participante[validos]
+    
+    # Agregados por problema com bincount (mesmas fórmulas de montar_estatisticas)
+    n = len(problemas)
+    total = np.bincount(problema, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        medias = [np.bincount(problema, weights=votos[:, c], minlength=n) / total for c in (2, 3, 4)]
+    gut = np.round(np.nan_to_num(medias[0] * medias[1] * medias[2]), 2)
+    posicao = np.empty(n, dtype=np.int16)
+    posicao[np.argsort(-gut, kind="stable")] = np.arange(1, n + 1)
+    
+    destino = caminho_colunar(caminho_banco)
+    os.makedirs(DIRETORIO_ARQUIVO_COLUNAR, exist_ok=True)
+    _salvar_npz(
+        destino,
+        encerrada_em=np.int64(os.path.getmtime(caminho_banco)),
+        codigo=np.array([p[1] for p in problemas], dtype=str),
+        nome=np.array([p[2] for p in problemas], dtype=str),
+        votos=total.astype(np.int32),
+        media_g=np.round(np.nan_to_num(medias[0]), 2).astype(np.float32),
+        media_u=np.round(np.nan_to_num(medias[1]), 2).astype(np.float32),
+        media_t=np.round(np.nan_to_num(medias[2]), 2).astype(np.float32),
+        gut=gut.astype(np.float32),
+        posicao=posicao,
+        participante_nome=np.array([p[1] for p in participantes], dtype=str),
+        voto_problema=problema.astype(np.int32),
+        voto_participante=participante.astype(np.int32),
+        gravidade=votos[:, 2].astype(np.int8),
+        urgencia=votos[:, 3].astype(np.int8),
+        tendencia=votos[:, 4].astype(np.int8),
+        criado_em=votos[:, 5],
+    )
+    return destino
+
+# Colunas por problema copiadas de cada oficina para o índice
+COLUNAS_INDICE = ("codigo", "nome", "votos", "gut", "posicao")
+
+def atualizar_indice_oficinas():
+    """Reconstrói o índice a partir dos .npz das oficinas (lendo só as colunas do índice)"""
+    arquivos = sorted(
+        a for a in glob.glob(os.path.join(DIRETORIO_ARQUIVO_COLUNAR, '*.npz')) if a != INDICE_OFICINAS
+    )
+    oficinas, encerradas, partes = [], [], {c: [] for c in COLUNAS_INDICE}
+    partes["oficina"] = []
+    for i, arquivo in enumerate(arquivos):
+        with np.load(arquivo) as dados:
+            oficinas.append(os.path.splitext(os.path.basename(arquivo))[0])
+            encerradas.append(int(dados["encerrada_em"]))
+            for coluna in COLUNAS_INDICE:
+                partes[coluna].append(dados[coluna])
+            partes["oficina"].append(np.full(len(dados["codigo"]), i, dtype=np.int32))
+    
+    ordem = np.argsort(encerradas, kind="stable")  # índices de oficina em ordem cronológica
+    reordenar = np.empty(len(ordem), dtype=np.int32)
+    reordenar[ordem] = np.arange(len(ordem))
+    colunas = {c: np.concatenate(v) if v else np.array([]) for c, v in partes.items()}
+    if len(ordem):
+        colunas["oficina"] = reordenar[colunas["oficina"]]
+    
+    os.makedirs(DIRETORIO_ARQUIVO_COLUNAR, exist_ok=True)
+    _salvar_npz(
+        INDICE_OFICINAS,
+        oficinas=np.array(oficinas, dtype=str)[ordem] if oficinas else np.array([], dtype=str),
+        encerradas_em=np.array(encerradas, dtype=np.int64)[ordem],
+        **colunas
+    )
+
+def arquivar_oficinas_pendentes():
+    """Gera o .npz das oficinas encerradas que ainda não têm um e atualiza o índice.
+    Retorna quantas oficinas foram convertidas."""
+    convertidas = 0
+    for oficina in listar_oficinas_arquivadas():
+        if not os.path.exists(caminho_colunar(oficina["arquivo"])):
+            arquivar_oficina_colunar(oficina["arquivo"])
+            convertidas += 1
+    atualizar_indice_oficinas()
+    return convertidas
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def carregar_indice_oficinas(modificado_em):
+    """Colunas do índice (em memória); `modificado_em` é o mtime do arquivo, para recarregar quando muda"""
+    with np.load(INDICE_OFICINAS) as dados:
+        return {nome: dados[nome] for nome in dados.files}
+
+def indice_oficinas():
+    """Índice das oficinas arquivadas, ou None se ainda não existe"""
+    if not os.path.exists(INDICE_OFICINAS):
+        return None
+    return carregar_indice_oficinas(os.path.getmtime(INDICE_OFICINAS))
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def carregar_oficinas_arquivadas(arquivos, atual):
+    """listar_oficinas_arquivadas sem abrir os bancos a cada rerun; `arquivos` são os pares
+    (caminho, mtime) dos bancos encerrados, para recarregar quando uma oficina é selada"""
+    return listar_oficinas_arquivadas()
+
+def oficinas_arquivadas():
+    """Oficinas encerradas (ver listar_oficinas_arquivadas), em cache até algum banco mudar.
+    
+    O banco em andamento fica fora da chave: seu mtime muda a cada checkpoint do WAL.
+    """
+    atual = os.path.abspath(banco_atual())
+    caminhos = glob.glob(os.path.join(DIRETORIO_OFICINAS, 'oficina_*.db'))
+    arquivos = tuple(sorted(
+        (caminho, os.path.getmtime(caminho)) for caminho in caminhos if os.path.abspath(caminho) != atual
+    ))
+    return carregar_oficinas_arquivadas(arquivos, atual)
+
+def tendencia_problema(indice, codigo):
+    """Posição e pontuação de um problema em cada oficina arquivada em que apareceu"""
+    linhas = np.flatnonzero(indice["codigo"] == codigo)
+    oficinas = indice["oficina"][linhas]
+    return pd.DataFrame({
+        "Oficina": indice["oficinas"][oficinas],
+        "Encerrada em": pd.to_datetime(indice["encerradas_em"][oficinas], unit="s"),
+        "Posição": indice["posicao"][linhas],
+        "Pontuação GUT": indice["gut"][linhas],
+        "Votos": indice["votos"][linhas],
+    }).sort_values("Encerrada em")
+
+# ===================== CACHE DE RESULTADOS =====================
+# Resultados agregados compartilhados por todas as sessões do processo (projetor, admin,
+# participantes). A chave é o contador de mudanças do SQLite: PRAGMA data_version muda
+# sempre que OUTRA conexão (deste ou de outro processo) confirma uma escrita, então uma
+# conexão observadora que nunca escreve enxerga todo voto, cadastro ou reset.
+
+class ObservadorVersao:
+    """Conexão dedicada, só de leitura, usada apenas para ler PRAGMA data_version"""
+    
+    def __init__(self, caminho):
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._lock = threading.Lock()
+        # Valores de data_version só são comparáveis dentro da mesma conexão
+        self.token = f"{id(self)}-{time.time_ns()}"
+    
+    def versao(self):
+        with self._lock:
+            return self._conn.execute('PRAGMA data_version').fetchone()[0]
+    
+    def fechar(self):
+        with self._lock:
+            self._conn.close()
+
+@st.cache_resource
+def criar_observador_versao(caminho):
+    """Observador único por processo para o arquivo `caminho`"""
+    criar_pool(caminho)  # garante o banco criado e migrado
+    observador = ObservadorVersao(caminho)
+    registro_recursos().registrar(caminho, "observador")
+    return observador
+
+def versao_dados():
+    """Chave da versão atual dos dados; muda a cada escrita confirmada no banco
+    e também quando outra oficina passa a ser a atual (o token é do observador)"""
+    observador = criar_observador_versao(banco_atual())
+    return (observador.token, observador.versao())
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def carregar_resultados(versao):
+    """Problemas, estatísticas por problema e totais gerais; recalculados só quando `versao` muda"""
+    return {
+        "problemas": listar_problemas_db(),
+        "estatisticas": calcular_estatisticas_todos_db(),
+        "gerais": obter_estatisticas_db(),
+        "distribuicao": obter_distribuicao_votos_db(),
+    }
+
+def resultados_em_cache():
+    """Resultados agregados da versão atual dos dados (compartilhados entre sessões)"""
+    return carregar_resultados(versao_dados())
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def carregar_historico(versao):
+    """Resumo do log de eventos da versão `versao` (ver resumo_historico_db)"""
+    return resumo_historico_db()
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def carregar_estatisticas_no_momento(versao, momento):
+    """Estatísticas por problema no instante `momento`, reconstruídas uma vez por versão"""
+    return estatisticas_no_momento_db(momento)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def carregar_linha_do_tempo(versao, inicio, fim):
+    """Linha do tempo de (inicio, fim]; `fim` chega arredondado para o cache valer entre reruns"""
+    return linha_do_tempo_db(inicio, fim)
 
 def classificar_prioridade(pontuacao):
     """Classifica prioridade baseada na pontuação GUT"""
@@ -311,6 +1482,673 @@ def formatar_consenso(consenso):
     else:
         return f'<span class="consensus-low">❌ {consenso}</span>'
 
+def exibir_card_problema(i, prob):
+    """Card com título e descrição do problema na tela de votação"""
+    st.markdown(f"""
+    <div class="vote-card">
+        <div class="problem-title">
+            📋 Problema {i}: {prob['nome']}
+        </div>
+        {f'<div class="problem-description">📝 {prob["descricao"]}</div>' if prob['descricao'] else ''}
+    </div>
+    """, unsafe_allow_html=True)
+
+def sliders_voto(prob, voto_existente):
+    """Sliders G-U-T (pré-preenchidos com o voto existente) e prévia da pontuação"""
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        g = st.slider(
+            "⚠️ **Gravidade**", 
+            1, 5, 
+            voto_existente['gravidade'] if voto_existente else 3,
+            key=f"g{prob['id']}",
+            help="Quão grave é este problema? (1=Pouco grave, 5=Muito grave)"
+        )
+    
+    with col2:
+        u = st.slider(
+            "⏳ **Urgência**", 
+            1, 5, 
+            voto_existente['urgencia'] if voto_existente else 3,
+            key=f"u{prob['id']}",
+            help="Quão urgente é resolver? (1=Pode esperar, 5=Urgentíssimo)"
+        )
+    
+    with col3:
+        t = st.slider(
+            "📈 **Tendência**", 
+            1, 5, 
+            voto_existente['tendencia'] if voto_existente else 3,
+            key=f"t{prob['id']}",
+            help="Tendência de piorar? (1=Estável, 5=Vai piorar muito)"
+        )
+    
+    # Preview da pontuação
+    preview_pontuacao = g * u * t
+    prioridade_preview, _ = classificar_prioridade(preview_pontuacao)
+    
+    st.info(f"**Sua pontuação**: {preview_pontuacao} | **Prioridade**: {prioridade_preview}")
+    
+    return g, u, t
+
+def votos_participante_em_cache(participante):
+    """Votos do participante guardados na sessão; só vão ao banco após invalidação
+    (ou quando outra oficina passa a ser a atual)"""
+    cache = st.session_state.get('votos_participante')
+    banco = banco_atual()
+    if cache is None or cache['participante'] != participante or cache['banco'] != banco:
+        cache = {"participante": participante, "banco": banco, "votos": obter_votos_participante_db(participante)}
+        st.session_state.votos_participante = cache
+    return cache['votos']
+
+def invalidar_votos_participante():
+    """Descarta o cache de votos da sessão (chamar após o participante votar)"""
+    st.session_state.pop('votos_participante', None)
+
+# Cards da "Análise Detalhada por Problema" exibidos por página
+CARDS_POR_PAGINA = 10
+
+def exibir_detalhe_problema(stats):
+    """Conteúdo do card de detalhe: métricas, consenso, intensidade e interpretação automática"""
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric(
+            "👥 Total de Votos", 
+            stats['total'],
+            help="Número de pessoas que avaliaram este problema"
+        )
+    
+    with col2:
+        st.metric(
+            "⚠️ Gravidade", 
+            f"{stats['mg']:.1f}",
+            delta=f"Soma: {stats['sg']}",
+            help="Média das avaliações de gravidade"
+        )
+    
+    with col3:
+        st.metric(
+            "⏳ Urgência", 
+            f"{stats['mu']:.1f}",
+            delta=f"Soma: {stats['su']}",
+            help="Média das avaliações de urgência"
+        )
+    
+    with col4:
+        st.metric(
+            "📈 Tendência", 
+            f"{stats['mt']:.1f}",
+            delta=f"Soma: {stats['st']}",
+            help="Média das avaliações de tendência"
+        )
+    
+    # Consenso
+    col_cons1, col_cons2, col_cons3 = st.columns(3)
+    with col_cons1:
+        st.markdown(f"**Consenso G:** {formatar_consenso(stats['consenso_g'])}", unsafe_allow_html=True)
+    with col_cons2:
+        st.markdown(f"**Consenso U:** {formatar_consenso(stats['consenso_u'])}", unsafe_allow_html=True)
+    with col_cons3:
+        st.markdown(f"**Consenso T:** {formatar_consenso(stats['consenso_t'])}", unsafe_allow_html=True)
+    
+    # Barras de progresso visuais
+    st.markdown("**📊 Intensidade dos Critérios:**")
+    
+    col_g, col_u, col_t = st.columns(3)
+    
+    with col_g:
+        st.progress(stats['mg']/5, text=f"Gravidade: {stats['mg']:.1f}/5")
+    with col_u:
+        st.progress(stats['mu']/5, text=f"Urgência: {stats['mu']:.1f}/5")
+    with col_t:
+        st.progress(stats['mt']/5, text=f"Tendência: {stats['mt']:.1f}/5")
+    
+    # Interpretação automática
+    st.markdown("**🤖 Interpretação Automática:**")
+    
+    interpretacao = []
+    if stats['mg'] >= 4: interpretacao.append("⚠️ **Problema muito grave**")
+    if stats['mu'] >= 4: interpretacao.append("⏰ **Requer ação imediata**") 
+    if stats['mt'] >= 4: interpretacao.append("📈 **Vai piorar rapidamente**")
+    if stats['consenso_g'] == "Baixo": interpretacao.append("🤔 **Divergência sobre gravidade - discutir mais**")
+    if stats['consenso_u'] == "Baixo": interpretacao.append("🤔 **Divergência sobre urgência - discutir mais**")
+    if stats['consenso_t'] == "Baixo": interpretacao.append("🤔 **Divergência sobre tendência - discutir mais**")
+    
+    if interpretacao:
+        for item in interpretacao:
+            st.markdown(f"- {item}")
+    else:
+        st.markdown("- ✅ **Problema bem avaliado e consensual**")
+
+# ===================== FIGURAS EM CACHE =====================
+# Tabelas e figuras do dashboard montadas uma vez por versão dos dados: reruns sem voto
+# novo (sliders, abas, paginação, fragmentos) reaproveitam a especificação pronta em vez
+# de refazer cada px.bar/px.histogram/px.scatter.
+#
+# O tamanho das figuras não cresce com a oficina: gráficos por categoria mostram só os
+# LIMITE_CATEGORIAS_GRAFICO primeiros problemas mais uma barra "Outros", histogramas
+# chegam ao navegador já contados e a dispersão passa a WebGL acima do limite.
+LIMITE_CATEGORIAS_GRAFICO = 30
+FAIXAS_PONTUACAO_GUT = np.linspace(0, 125, 11)
+
+def top_n_com_outros(df, n=LIMITE_CATEGORIAS_GRAFICO):
+    """Primeiras `n` linhas de `df` (já ordenado) e uma linha "Outros" com a média das demais"""
+    if len(df) <= n:
+        return df
+    restantes = df.iloc[n:]
+    outros = restantes.mean(numeric_only=True).to_frame().T
+    outros.insert(0, "Problema", f"Outros ({len(restantes)} problemas, média)")
+    return pd.concat([df.iloc[:n], outros], ignore_index=True)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def tabelas_resultados(versao):
+    """DataFrames do dashboard (completo, simples e de consenso) para uma versão dos dados"""
+    resultados = carregar_resultados(versao)
+    estatisticas = resultados["estatisticas"]
+    resultados_completos = []
+    dados_simples = []
+    dados_consenso = []
+    
+    for p in resultados["problemas"]:
+        stats = estatisticas.get(p['id'])
+        if stats:
+            resultados_completos.append({
+                "🏷️ Problema": p['nome'],
+                "👥 Votos": stats['total'],
+                
+                # GRAVIDADE
+                "⚠️ G (Média)": f"{stats['mg']:.1f}",
+                "📊 G (Soma)": stats['sg'],
+                "🎯 G (Consenso)": stats['consenso_g'],
+                
+                # URGÊNCIA  
+                "⏳ U (Média)": f"{stats['mu']:.1f}",
+                "📊 U (Soma)": stats['su'],
+                "🎯 U (Consenso)": stats['consenso_u'],
+                
+                # TENDÊNCIA
+                "📈 T (Média)": f"{stats['mt']:.1f}",
+                "📊 T (Soma)": stats['st'],
+                "🎯 T (Consenso)": stats['consenso_t'],
+                
+                # RESULTADO FINAL
+                "🏆 Pontuação GUT": f"{stats['gut']:.1f}",
+                "🎖️ Prioridade": classificar_prioridade(stats['gut'])[0]
+            })
+            
+            # Para gráficos
+            dados_simples.append({
+                "Problema": p['nome'],
+                "Total Votos": stats['total'],
+                "Média Gravidade": stats['mg'], 
+                "Média Urgência": stats['mu'],
+                "Média Tendência": stats['mt'], 
+                "Pontuação GUT": stats['gut'],
+                "Desvio Gravidade": stats['std_g'],
+                "Desvio Urgência": stats['std_u'],
+                "Desvio Tendência": stats['std_t'],
+                "Mediana Gravidade": stats['med_g'],
+                "Mediana Urgência": stats['med_u'],
+                "Mediana Tendência": stats['med_t']
+            })
+            
+            # Para a análise de consenso
+            nome_curto = p['nome'][:20] + "..." if len(p['nome']) > 20 else p['nome']
+            dados_consenso.append({
+                "Problema": nome_curto,
+                "Desvio Gravidade": stats['std_g'],
+                "Desvio Urgência": stats['std_u'], 
+                "Desvio Tendência": stats['std_t'],
+                "Pontuação GUT": stats['gut']
+            })
+    
+    df_completo = pd.DataFrame(resultados_completos)
+    df_simples = pd.DataFrame(dados_simples)
+    if not df_simples.empty:
+        df_simples = df_simples.sort_values("Pontuação GUT", ascending=False)
+        df_simples["Prioridade"] = df_simples["Pontuação GUT"].apply(lambda x: classificar_prioridade(x)[0])
+    return df_completo, df_simples, pd.DataFrame(dados_consenso)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def exportar_csv_resultados(versao):
+    """CSV (bytes) dos resultados do dashboard; gerado no primeiro download de cada versão"""
+    _, df_simples, _ = tabelas_resultados(versao)
+    return df_simples.to_csv(index=False).encode('utf-8')
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def figuras_resultados(versao):
+    """Especificações (dict) das figuras do dashboard; vazio enquanto não há votos"""
+    _, df_simples, df_consenso = tabelas_resultados(versao)
+    if df_simples.empty:
+        return {}
+    
+    colunas_graficos = ["Problema", "Total Votos", "Média Gravidade", "Média Urgência", "Média Tendência", "Pontuação GUT"]
+    df_top = top_n_com_outros(df_simples[colunas_graficos])
+    
+    # Ranking
+    fig_ranking = px.bar(
+        df_top, 
+        x="Pontuação GUT", 
+        y="Problema", 
+        orientation="h",
+        text="Pontuação GUT",
+        color="Pontuação GUT",
+        color_continuous_scale=px.colors.sequential.Blues,
+        title="Problemas ordenados por prioridade (maior pontuação = maior prioridade)"
+    )
+    fig_ranking.update_traces(texttemplate='%{text:.1f}', textposition="outside")
+    fig_ranking.update_layout(height=max(400, 22 * len(df_top)), yaxis=dict(autorange="reversed"))
+    
+    # Médias G-U-T
+    dfm = df_top.melt(
+        id_vars="Problema",
+        value_vars=["Média Gravidade", "Média Urgência", "Média Tendência"],
+        var_name="Critério",
+        value_name="Média"
+    )
+    dfm['Critério'] = dfm['Critério'].str.replace("Média ", "")
+    
+    figm = px.bar(
+        dfm, 
+        x="Problema", 
+        y="Média", 
+        color="Critério", 
+        barmode="group",
+        text="Média",
+        color_discrete_map={
+            "Gravidade": "#1f77b4",
+            "Urgência": "#2ca02c", 
+            "Tendência": "#ff7f0e"
+        },
+        title="Médias por critério para cada problema"
+    )
+    figm.update_traces(texttemplate='%{text:.2f}', textposition="outside")
+    figm.update_layout(height=400)
+    
+    # Distribuição: contagens por faixa calculadas aqui, só 10 barras vão ao navegador
+    contagens, faixas = np.histogram(df_simples["Pontuação GUT"], bins=FAIXAS_PONTUACAO_GUT)
+    figh = px.bar(
+        x=(faixas[:-1] + faixas[1:]) / 2,
+        y=contagens,
+        text=contagens,
+        color_discrete_sequence=["#1f77b4"],
+        labels={"x": "Pontuação GUT", "y": "Problemas"},
+        title="Distribuição das pontuações GUT"
+    )
+    figh.update_traces(width=faixas[1] - faixas[0], texttemplate='%{text}', textposition="outside")
+    figh.update_layout(height=400, bargap=0.05)
+    
+    # Distribuição dos votos: direto dos histogramas materializados, sem ler votos individuais
+    df_notas = pd.DataFrame([
+        {"Critério": criterio, "Nota": nota, "Votos": votos}
+        for criterio, contagens_criterio in carregar_resultados(versao)["distribuicao"].items()
+        for nota, votos in enumerate(contagens_criterio, start=1)
+    ])
+    fig_notas = px.bar(
+        df_notas,
+        x="Nota",
+        y="Votos",
+        color="Critério",
+        barmode="group",
+        text="Votos",
+        color_discrete_map={
+            "Gravidade": "#1f77b4",
+            "Urgência": "#2ca02c", 
+            "Tendência": "#ff7f0e"
+        },
+        title="Distribuição das notas dadas em cada critério"
+    )
+    fig_notas.update_traces(textposition="outside")
+    fig_notas.update_layout(height=400)
+    
+    # Participação
+    figp = px.bar(
+        df_top, 
+        x="Problema", 
+        y="Total Votos", 
+        text="Total Votos",
+        color_discrete_sequence=["#2ca02c"],
+        title="Número de votos recebidos por cada problema"
+    )
+    figp.update_traces(texttemplate='%{text}', textposition="outside")
+    figp.update_layout(height=400)
+    
+    # Consenso
+    fig_consenso = px.scatter(
+        df_consenso,
+        x="Desvio Gravidade",
+        y="Desvio Urgência", 
+        size="Pontuação GUT",
+        color="Desvio Tendência",
+        hover_name="Problema",
+        render_mode="webgl" if len(df_consenso) > LIMITE_CATEGORIAS_GRAFICO else "svg",
+        title="Consenso vs Divergência (menor desvio = maior consenso)",
+        labels={
+            "Desvio Gravidade": "Divergência na Gravidade",
+            "Desvio Urgência": "Divergência na Urgência"
+        }
+    )
+    
+    fig_consenso.add_hline(y=0.8, line_dash="dash", line_color="green", 
+                          annotation_text="Limite consenso alto")
+    fig_consenso.add_vline(x=0.8, line_dash="dash", line_color="green")
+    fig_consenso.add_hline(y=1.5, line_dash="dash", line_color="orange", 
+                          annotation_text="Limite consenso médio")
+    fig_consenso.add_vline(x=1.5, line_dash="dash", line_color="orange")
+    
+    return {
+        "ranking": fig_ranking.to_dict(),
+        "medias": figm.to_dict(),
+        "distribuicao": figh.to_dict(),
+        "notas": fig_notas.to_dict(),
+        "participacao": figp.to_dict(),
+        "consenso": fig_consenso.to_dict(),
+    }
+
+# ===================== MAPA DE VOTOS =====================
+# Matriz participante × problema mantida em memória como int8 por critério (1 byte por
+# nota: 1.000 participantes × 200 problemas ocupam 600 KB). Carregada com uma leitura de
+# votos por versão dos dados; ordenação e redução para o navegador são operações NumPy.
+MAX_LINHAS_MAPA = 150
+MAX_COLUNAS_MAPA = 100
+CRITERIOS_MAPA = ["GUT (G×U×T)", "Gravidade", "Urgência", "Tendência"]
+ORDENS_PARTICIPANTES = ["Nome", "Média da nota (maior primeiro)", "Número de votos"]
+ORDENS_PROBLEMAS = ["Pontuação GUT (maior primeiro)", "Ordem de cadastro"]
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def carregar_matriz_votos(versao):
+    """Matriz de votos da versão `versao` (ver obter_matriz_votos_db)"""
+    return obter_matriz_votos_db()
+
+def reduzir_blocos(z, max_linhas, max_colunas):
+    """Média de blocos de células (ignorando NaN) para caber em max_linhas × max_colunas.
+    Retorna a matriz reduzida e o tamanho dos blocos (linhas, colunas)."""
+    fl = max(1, -(-z.shape[0] // max_linhas))
+    fc = max(1, -(-z.shape[1] // max_colunas))
+    if fl == 1 and fc == 1:
+        return z, (1, 1)
+    
+    linhas, colunas = -(-z.shape[0] // fl), -(-z.shape[1] // fc)
+    preenchida = np.full((linhas * fl, colunas * fc), np.nan)
+    preenchida[:z.shape[0], :z.shape[1]] = z
+    blocos = preenchida.reshape(linhas, fl, colunas, fc)
+    contagens = (~np.isnan(blocos)).sum(axis=(1, 3))
+    somas = np.nansum(blocos, axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(contagens > 0, somas / contagens, np.nan), (fl, fc)
+
+def rotulos_blocos(nomes, tamanho):
+    """Rótulos dos eixos depois da redução: nome original ou "primeiro … (n)" por bloco"""
+    if tamanho == 1:
+        return [nome[:30] for nome in nomes]
+    return [
+        f"{nomes[i][:20]} … (+{len(nomes[i:i + tamanho]) - 1})"
+        for i in range(0, len(nomes), tamanho)
+    ]
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def figura_mapa_votos(versao, criterio, ordem_participantes, ordem_problemas):
+    """Especificação do heatmap participante × problema e o tamanho dos blocos usados"""
+    matriz = carregar_matriz_votos(versao)
+    notas = matriz["notas"]
+    
+    if criterio == CRITERIOS_MAPA[0]:
+        valores = notas.astype(np.int16).prod(axis=0)
+        escala_max = 125
+    else:
+        valores = notas[CRITERIOS_MAPA.index(criterio) - 1].astype(np.int16)
+        escala_max = 5
+    z = np.where(notas[0] > 0, valores, np.nan)
+    
+    # Ordenação das linhas (participantes)
+    votados = (notas[0] > 0).sum(axis=1)
+    if ordem_participantes == ORDENS_PARTICIPANTES[1]:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            medias = np.nansum(z, axis=1) / votados
+        ordem_linhas = np.argsort(-np.nan_to_num(medias, nan=-1), kind="stable")
+    elif ordem_participantes == ORDENS_PARTICIPANTES[2]:
+        ordem_linhas = np.argsort(-votados, kind="stable")
+    else:
+        ordem_linhas = np.arange(z.shape[0])
+    
+    # Ordenação das colunas (problemas)
+    if ordem_problemas == ORDENS_PROBLEMAS[0]:
+        estatisticas = carregar_resultados(versao)["estatisticas"]
+        pontuacoes = np.array([estatisticas[pid]['gut'] if pid in estatisticas else -1 for pid in matriz["problema_ids"]])
+        ordem_colunas = np.argsort(-pontuacoes, kind="stable")
+    else:
+        ordem_colunas = np.arange(z.shape[1])
+    
+    z = z[ordem_linhas][:, ordem_colunas]
+    z, (fl, fc) = reduzir_blocos(z, MAX_LINHAS_MAPA, MAX_COLUNAS_MAPA)
+    nomes_linhas = rotulos_blocos([matriz["participantes"][i] for i in ordem_linhas], fl)
+    nomes_colunas = rotulos_blocos([matriz["problemas"][i] for i in ordem_colunas], fc)
+    
+    fig = go.Figure(go.Heatmap(
+        z=np.round(z, 2),
+        x=nomes_colunas,
+        y=nomes_linhas,
+        zmin=1,
+        zmax=escala_max,
+        colorscale="RdYlGn_r",
+        hoverongaps=False,
+        hovertemplate="Participante: %{y}<br>Problema: %{x}<br>" + criterio + ": %{z}<extra></extra>",
+    ))
+    fig.update_layout(
+        height=min(900, max(400, 14 * len(nomes_linhas) + 150)),
+        xaxis=dict(showticklabels=len(nomes_colunas) <= 40, title="Problemas"),
+        yaxis=dict(autorange="reversed", showticklabels=len(nomes_linhas) <= 60, title="Participantes"),
+        title=f"{criterio} por participante e problema (células vazias = sem voto)"
+    )
+    return fig.to_dict(), (fl, fc)
+
+def exibir_mapa_votos(versao):
+    """Controles e heatmap do mapa de votos"""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        criterio = st.selectbox("Valor exibido", CRITERIOS_MAPA, key="mapa_criterio")
+    with col2:
+        ordem_participantes = st.selectbox("Ordenar participantes por", ORDENS_PARTICIPANTES, key="mapa_ordem_participantes")
+    with col3:
+        ordem_problemas = st.selectbox("Ordenar problemas por", ORDENS_PROBLEMAS, key="mapa_ordem_problemas")
+    
+    figura, (fl, fc) = figura_mapa_votos(versao, criterio, ordem_participantes, ordem_problemas)
+    if fl > 1 or fc > 1:
+        st.caption(
+            f"Sala grande: cada célula é a média de blocos de até {fl} participante(s) × {fc} problema(s)."
+        )
+    st.plotly_chart(figura, use_container_width=True)
+
+# ===================== INCERTEZA DO RANKING =====================
+# Bootstrap por participante sobre a matriz de votos do mapa: cada reamostragem sorteia
+# participantes com reposição e vira uma linha de pesos; somas e votantes de todas as
+# reamostragens saem de um produto matricial (reamostragens × participantes) @ (participantes × problemas).
+N_REAMOSTRAGENS = 2000
+NIVEL_CONFIANCA = 0.95
+SEMENTE_BOOTSTRAP = 42  # fixa: o mesmo resultado a cada rerun da mesma versão dos dados
+
+def bootstrap_ranking(notas, k, reamostragens=N_REAMOSTRAGENS, nivel=NIVEL_CONFIANCA, semente=SEMENTE_BOOTSTRAP):
+    """Intervalos de confiança da pontuação GUT e probabilidade de cada problema ficar no top k.
+    
+    `notas` é a matriz int8 (3, participantes, problemas) de obter_matriz_votos_db.
+    Retorna arrays por problema: gut (amostra original, NaN sem votos), ic_inferior, ic_superior,
+    prob_top_k, prob_acima_seguinte (na ordem de `gut`, chance de ficar à frente do problema
+    seguinte) e prob_sem_votantes (fração das reamostragens em que ninguém votou no problema).
+    Empates (comuns com notas inteiras e salas pequenas) dividem o crédito em partes iguais.
+    """
+    n_participantes, n_problemas = notas.shape[1:]
+    rng = np.random.default_rng(semente)
+    
+    # Pesos = quantas vezes cada participante saiu em cada reamostragem
+    sorteados = rng.integers(0, n_participantes, size=(reamostragens, n_participantes))
+    deslocamento = np.arange(reamostragens)[:, None] * n_participantes
+    pesos = np.bincount((sorteados + deslocamento).ravel(), minlength=reamostragens * n_participantes)
+    pesos = np.vstack([np.ones(n_participantes), pesos.reshape(reamostragens, n_participantes)])
+    
+    votantes = pesos @ (notas[0] > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gut = np.prod([pesos @ notas[c] for c in range(3)], axis=0) / votantes ** 3
+    # O arredondamento faz pontuações iguais por caminhos diferentes (ex.: 3×4×5 e 5×4×3)
+    # empatarem de fato; sem votantes a pontuação fica NaN
+    gut = np.round(gut, 9)
+    original, amostras = gut[0], gut[1:]
+    sem_votantes = np.isnan(amostras)
+    
+    # Intervalos só sobre as reamostragens em que o problema teve votos
+    alfa = (1 - nivel) / 2
+    ic_inferior, ic_superior = np.full((2, n_problemas), np.nan)
+    com_votos = ~np.isnan(original)
+    ic_inferior[com_votos], ic_superior[com_votos] = np.nanquantile(
+        amostras[:, com_votos], [alfa, 1 - alfa], axis=0
+    )
+    
+    # Para ordenar, problema sem votantes na reamostragem fica no fim do ranking dela
+    ordenaveis = np.where(sem_votantes, -1.0, amostras)
+    
+    # Top k por reamostragem: acima da k-ésima pontuação entra inteiro; quem empata com ela
+    # divide as vagas que sobraram
+    k = min(k, n_problemas)
+    corte = -np.partition(-ordenaveis, k - 1, axis=1)[:, k - 1:k]
+    acima = ordenaveis > corte
+    empatados = ordenaveis == corte
+    vagas = (k - acima.sum(axis=1, keepdims=True)) / empatados.sum(axis=1, keepdims=True)
+    prob_top_k = (acima + empatados * vagas).mean(axis=0)
+    
+    ordem = np.argsort(-np.nan_to_num(original, nan=-1.0), kind="stable")
+    prob_acima_seguinte = np.full(n_problemas, np.nan)
+    atual, seguinte = ordenaveis[:, ordem[:-1]], ordenaveis[:, ordem[1:]]
+    prob_acima_seguinte[ordem[:-1]] = ((atual > seguinte) + 0.5 * (atual == seguinte)).mean(axis=0)
+    
+    return {
+        "gut": original,
+        "ic_inferior": ic_inferior,
+        "ic_superior": ic_superior,
+        "prob_top_k": prob_top_k,
+        "prob_acima_seguinte": prob_acima_seguinte,
+        "prob_sem_votantes": sem_votantes.mean(axis=0),
+    }
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def incerteza_ranking(versao, k):
+    """Tabela de incerteza do ranking da versão `versao`, só com problemas que têm votos"""
+    matriz = carregar_matriz_votos(versao)
+    notas = matriz["notas"]
+    if not notas.shape[1] or not notas.shape[2]:
+        return pd.DataFrame()
+    
+    resultado = bootstrap_ranking(notas, k)
+    df = pd.DataFrame({
+        "Problema": matriz["problemas"],
+        "Pontuação GUT": resultado["gut"],
+        "IC inferior": resultado["ic_inferior"],
+        "IC superior": resultado["ic_superior"],
+        f"P(top {k})": resultado["prob_top_k"],
+        "P(à frente do seguinte)": resultado["prob_acima_seguinte"],
+        "Reamostragens sem votos": resultado["prob_sem_votantes"],
+    })
+    df = df[df["Pontuação GUT"].notna()].sort_values("Pontuação GUT", ascending=False, kind="stable")
+    df.insert(0, "Posição", range(1, len(df) + 1))
+    return df.round(2).reset_index(drop=True)
+
+def exibir_incerteza_ranking(versao):
+    """Controles, gráfico de intervalos e tabela de probabilidades do ranking"""
+    n_problemas = len(carregar_resultados(versao)["estatisticas"])
+    k = 1
+    if n_problemas > 1:
+        k = st.slider("Tamanho do top k", 1, min(20, n_problemas), min(5, n_problemas), key="incerteza_top_k")
+    df = incerteza_ranking(versao, k)
+    if df.empty:
+        st.info("📊 Nenhum voto registrado ainda.")
+        return
+    
+    st.caption(
+        f"{N_REAMOSTRAGENS} reamostragens dos participantes (bootstrap), intervalos de {NIVEL_CONFIANCA:.0%}. "
+        "Problemas com intervalos sobrepostos e P(à frente do seguinte) perto de 0,5 não se distinguem pelos votos. "
+        "Reamostragens sem votos: fração em que ninguém que votou no problema foi sorteado "
+        "(fora do intervalo, conta como último lugar no top k)."
+    )
+    df_grafico = df.head(LIMITE_CATEGORIAS_GRAFICO)
+    fig = px.scatter(
+        df_grafico, x="Problema", y="Pontuação GUT",
+        error_y=df_grafico["IC superior"] - df_grafico["Pontuação GUT"],
+        error_y_minus=df_grafico["Pontuação GUT"] - df_grafico["IC inferior"],
+        color=f"P(top {k})", color_continuous_scale="RdYlGn", range_color=[0, 1],
+        title=f"Pontuação GUT com intervalo de confiança de {NIVEL_CONFIANCA:.0%}"
+    )
+    fig.update_xaxes(tickangle=-45)
+    st.plotly_chart(fig, use_container_width=True)
+    if len(df) > LIMITE_CATEGORIAS_GRAFICO:
+        st.caption(f"Gráfico com os {LIMITE_CATEGORIAS_GRAFICO} primeiros; a tabela tem todos os problemas.")
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+# ===================== ATUALIZAÇÃO AO VIVO =====================
+# Fragmentos reexecutam sozinhos a cada INTERVALO_ATUALIZACAO_S sem rerun da página:
+# só a consulta de versão roda quando nada mudou (resultados vêm do cache compartilhado).
+INTERVALO_ATUALIZACAO_S = 5
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO_S)
+def aguardar_dados(versao):
+    """Estados vazios (sem problemas ou sem votos): recarrega a página quando os dados mudarem.
+    Sem isso o telão aberto antes do primeiro voto ficaria parado na mensagem de espera."""
+    if versao_dados() != versao:
+        st.rerun()
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO_S)
+def metricas_ao_vivo():
+    """Linha de métricas do dashboard executivo"""
+    resultados = resultados_em_cache()
+    stats = resultados["gerais"]
+    maior_pontuacao = max((e['gut'] for e in resultados["estatisticas"].values()), default=0)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📋 Problemas", stats["problemas"])
+    with col2:
+        st.metric("🗳️ Total de Votos", stats["votos"])
+    with col3:
+        st.metric("👥 Participantes", stats["participantes"])
+    with col4:
+        st.metric("🏆 Maior Pontuação", f"{maior_pontuacao:.1f}")
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO_S)
+def ranking_ao_vivo():
+    """Gráfico de barras do ranking por pontuação GUT"""
+    figuras = figuras_resultados(versao_dados())
+    if not figuras:
+        st.info("📊 Nenhum voto registrado ainda.")
+        return
+    
+    st.plotly_chart(figuras["ranking"], use_container_width=True)
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO_S)
+def lista_problemas_admin_ao_vivo():
+    """Problemas cadastrados com a contagem de votos de cada um (painel admin)"""
+    resultados = resultados_em_cache()
+    problemas = resultados["problemas"]
+    
+    if not problemas:
+        st.info("Nenhum problema cadastrado ainda.")
+    else:
+        estatisticas = resultados["estatisticas"]
+        
+        for p in problemas:
+            # Contar votos para este problema
+            stats = estatisticas.get(p['id'])
+            total_votos = stats['total'] if stats else 0
+            
+            with st.expander(f"📋 {p['nome']} ({total_votos} votos)"):
+                if p['descricao']:
+                    st.write(f"**Descrição:** {p['descricao']}")
+                st.write(f"**Cadastrado em:** {p['timestamp']}")
+                st.write(f"**ID:** {p['codigo']}")
+                
+                if st.button("🗑️ Remover", key=f"rm{p['id']}", type="secondary"): 
+                    if remover_problema_db(p['id']):
+                        st.success(f"✅ Problema '{p['nome']}' removido!")
+                        st.rerun()
+
 # ===================== ESTADOS DE SESSÃO =====================
 if 'modo' not in st.session_state: 
     st.session_state.modo = 'selecao'
@@ -319,8 +2157,10 @@ if 'participante_id' not in st.session_state:
 if 'admin_logado' not in st.session_state: 
     st.session_state.admin_logado = False
 
-# Inicializar banco na primeira execução
-init_database()
+# Preparar banco (migrações rodam uma vez por processo, não a cada rerun)
+obter_pool()
+# Backups agendados rodam desde a primeira visita, não só depois de abrir o painel admin
+obter_servico_backup()
 
 # ===================== TELAS =====================
 
@@ -329,7 +2169,7 @@ if st.session_state.modo == 'selecao':
     st.markdown("""<div class="main-header"><h1>⚖️ Matriz GUT 2.0</h1><h3>Tribunal de Justiça de Rondônia</h3><p>Sistema de Votação Colaborativa com Dashboard Executivo</p></div>""", unsafe_allow_html=True)
     
     # Mostrar estatísticas gerais
-    stats = obter_estatisticas_db()
+    stats = resultados_em_cache()["gerais"]
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("📋 Problemas", stats["problemas"])
@@ -385,9 +2225,9 @@ elif st.session_state.modo == 'admin' and st.session_state.admin_logado:
             st.session_state.modo = 'selecao'
             st.rerun()
     with colB:
-        if st.button("🗑️ Resetar Oficina (Apagar Todos os Dados)", type="secondary"):
+        if st.button("🗑️ Resetar Oficina (Arquivar e Começar do Zero)", type="secondary"):
             if resetar_banco_db():
-                st.success("✅ Oficina resetada com sucesso!")
+                st.success("✅ Oficina arquivada; nova oficina iniciada!")
                 st.rerun()
     
     st.markdown("---")
@@ -405,30 +2245,288 @@ elif st.session_state.modo == 'admin' and st.session_state.admin_logado:
         else:
             st.error("❌ Digite o nome do problema")
     
+    # Cadastro em lote a partir de planilha (ex.: matriz_gut.xlsx)
+    with st.expander("📥 Importar Problemas de Planilha (Excel/CSV)"):
+        st.caption("Uma linha por problema, com cabeçalho \"Problema\" (ou \"Nome\") e, se quiser, \"Descrição\".")
+        arquivo_problemas = st.file_uploader("Arquivo", type=["xlsx", "csv"], key="arquivo_problemas")
+        if arquivo_problemas is not None and st.button("Importar Problemas", type="primary"):
+            relatorio = importar_problemas_db(ler_problemas_arquivo(arquivo_problemas, arquivo_problemas.name))
+            if relatorio is not None:
+                st.session_state.relatorio_importacao_problemas = relatorio
+                st.rerun()
+        
+        relatorio = st.session_state.get('relatorio_importacao_problemas')
+        if relatorio:
+            st.success(f"✅ {relatorio['inseridos']} problema(s) cadastrado(s)")
+            if relatorio['existentes'] or relatorio['duplicados'] or relatorio['vazios']:
+                st.info(
+                    f"Ignorados: {relatorio['existentes']} já cadastrado(s), "
+                    f"{relatorio['duplicados']} repetido(s) no arquivo, {relatorio['vazios']} linha(s) sem nome"
+                )
+    
+    # Votos de sessões offline (cédulas de papel digitadas em planilha)
+    with st.expander("🗳️ Importar Votos de Cédulas (Excel/CSV)"):
+        st.caption("Colunas: Problema (nome ou código), Participante, Gravidade, Urgência e Tendência (1 a 5).")
+        arquivo_votos = st.file_uploader("Arquivo", type=["xlsx", "csv"], key="arquivo_votos")
+        if arquivo_votos is not None and st.button("Importar Votos", type="primary"):
+            try:
+                df_cedulas = ler_votos_arquivo(arquivo_votos, arquivo_votos.name)
+            except ValueError as e:
+                st.error(f"❌ Arquivo inválido: {e}")
+            else:
+                with st.spinner(f"Importando {len(df_cedulas)} linhas..."):
+                    validos, rejeitados = validar_votos(df_cedulas, mapa_codigos_problemas_db())
+                    relatorio = importar_votos_db(validos)
+                relatorio["rejeitados"] = rejeitados
+                st.session_state.relatorio_importacao_votos = relatorio
+                st.rerun()
+        
+        relatorio = st.session_state.get('relatorio_importacao_votos')
+        if relatorio:
+            st.success(f"✅ {relatorio['gravados']} voto(s) gravado(s)")
+            if relatorio['substituidos_no_arquivo']:
+                st.info(f"{relatorio['substituidos_no_arquivo']} linha(s) repetida(s) no arquivo: valeu a última de cada participante/problema")
+            rejeitados = relatorio["rejeitados"]
+            if len(rejeitados):
+                st.warning(f"⚠️ {len(rejeitados)} linha(s) rejeitada(s)")
+                st.dataframe(rejeitados.head(MAX_REJEITADOS_EXIBIDOS), use_container_width=True, hide_index=True)
+                st.download_button(
+                    "⬇️ Baixar linhas rejeitadas (CSV)",
+                    data=lambda: rejeitados.to_csv(index=False).encode('utf-8'),
+                    file_name="votos_rejeitados.csv",
+                    mime="text/csv"
+                )
+    
     st.markdown("---")
     
     # Lista de problemas cadastrados
     st.subheader("📋 Problemas Cadastrados")
-    problemas = listar_problemas_db()
+    lista_problemas_admin_ao_vivo()
     
-    if not problemas:
-        st.info("Nenhum problema cadastrado ainda.")
-    else:
-        for i, p in enumerate(problemas):
-            # Contar votos para este problema
-            stats = calcular_estatisticas_completas_db(p['id'])
-            total_votos = stats['total'] if stats else 0
+    st.markdown("---")
+    
+    # Backups online (também automáticos a cada INTERVALO_BACKUP_S)
+    with st.expander("💾 Backups do Banco"):
+        servico_backup = obter_servico_backup()
+        st.caption(
+            f"Cópia automática a cada {INTERVALO_BACKUP_S // 60} min quando há mudanças; "
+            f"são mantidas as {MAX_BACKUPS} mais recentes em `{DIRETORIO_BACKUPS}/`."
+        )
+        if st.button("💾 Fazer backup agora"):
+            servico_backup.solicitar()
+            st.toast("Backup iniciado em segundo plano")
+        
+        estado_backup = servico_backup.estado()
+        if estado_backup["em_andamento"]:
+            st.info("⏳ Backup em andamento...")
+        if estado_backup["erro"]:
+            st.error(f"❌ Último backup falhou: {estado_backup['erro']}")
+        if estado_backup["ultimo"]:
+            caminho_backup, quando = estado_backup["ultimo"]
+            st.success(f"✅ Último backup: `{caminho_backup}` ({quando})")
+        
+        backups = listar_backups()
+        if backups:
+            st.dataframe(
+                pd.DataFrame({
+                    "Arquivo": [os.path.basename(b) for b in backups],
+                    "Tamanho (MB)": [round(os.path.getsize(b) / 1024 ** 2, 2) for b in backups],
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+    
+    # Oficinas encerradas pelo reset continuam disponíveis, somente leitura
+    with st.expander("🗄️ Oficinas Anteriores"):
+        oficinas = oficinas_arquivadas()
+        if oficinas:
+            st.dataframe(
+                pd.DataFrame(oficinas).rename(columns={
+                    "arquivo": "Arquivo", "encerrada_em": "Encerrada em", "problemas": "Problemas",
+                    "votos": "Votos", "participantes": "Participantes"
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("Nenhuma oficina arquivada ainda.")
+        
+        # Evolução de um problema entre oficinas (lê só o índice colunar)
+        st.markdown("**📈 Evolução de um problema entre oficinas**")
+        if st.button("Atualizar arquivo colunar"):
+            with st.spinner("Convertendo oficinas..."):
+                convertidas = arquivar_oficinas_pendentes()
+            st.success(f"✅ {convertidas} oficina(s) convertida(s)")
+        
+        indice = indice_oficinas()
+        if indice is None or not len(indice["codigo"]):
+            st.caption("O arquivo colunar é gerado ao encerrar cada oficina (ou pelo botão acima).")
+        else:
+            # Nome mais recente de cada código de problema
+            recentes_primeiro = np.argsort(indice["oficina"], kind="stable")[::-1]
+            codigos, ultima = np.unique(indice["codigo"][recentes_primeiro], return_index=True)
+            nomes = indice["nome"][recentes_primeiro][ultima]
+            opcoes = dict(sorted(zip(nomes.tolist(), codigos.tolist())))
+            escolhido = st.selectbox("Problema", list(opcoes), key="problema_tendencia")
+            df_tendencia = tendencia_problema(indice, opcoes[escolhido])
             
-            with st.expander(f"📋 {p['nome']} ({total_votos} votos)"):
-                if p['descricao']:
-                    st.write(f"**Descrição:** {p['descricao']}")
-                st.write(f"**Cadastrado em:** {p['timestamp']}")
-                st.write(f"**ID:** {p['id']}")
-                
-                if st.button("🗑️ Remover", key=f"rm{i}", type="secondary"): 
-                    if remover_problema_db(p['id']):
-                        st.success(f"✅ Problema '{p['nome']}' removido!")
-                        st.rerun()
+            fig_tendencia = px.line(
+                df_tendencia, x="Encerrada em", y="Posição", markers=True,
+                hover_data=["Oficina", "Pontuação GUT", "Votos"],
+                title=f"Posição no ranking ao longo das oficinas: {escolhido}"
+            )
+            fig_tendencia.update_yaxes(autorange="reversed", dtick=1)
+            st.plotly_chart(fig_tendencia, use_container_width=True)
+            st.dataframe(df_tendencia, use_container_width=True, hide_index=True)
+    
+    # Histórico: o ranking em qualquer instante, reconstruído de snapshot + eventos
+    with st.expander("🕓 Histórico de Votos (auditoria)"):
+        versao = versao_dados()
+        historico = carregar_historico(versao)
+        # Problemas removidos continuam no log; só saem da exibição
+        nomes = {p["id"]: p["nome"] for p in carregar_resultados(versao)["problemas"]}
+        col1, col2 = st.columns(2)
+        col1.metric("Eventos de voto", historico["eventos"])
+        col2.metric("Snapshots", historico["snapshots"])
+        
+        if not historico["eventos"]:
+            st.info("Nenhum voto registrado ainda.")
+        else:
+            inicio = datetime.fromtimestamp(historico["primeiro"])
+            fim = datetime.fromtimestamp(historico["ultimo"])
+            momento = fim
+            if inicio < fim:
+                momento = st.slider(
+                    "Ranking no instante", min_value=inicio, max_value=fim, value=fim,
+                    format="DD/MM/YYYY HH:mm:ss", key="momento_historico"
+                )
+            
+            ranking = sorted(
+                (
+                    (nomes[pid], s)
+                    for pid, s in carregar_estatisticas_no_momento(versao, int(momento.timestamp())).items()
+                    if pid in nomes
+                ),
+                key=lambda item: item[1]["gut"], reverse=True
+            )
+            st.dataframe(
+                pd.DataFrame(
+                    [(i, nome, s["gut"], s["total"]) for i, (nome, s) in enumerate(ranking, 1)],
+                    columns=["Posição", "Problema", "Pontuação GUT", "Votos"]
+                ),
+                use_container_width=True,
+                hide_index=True
+            )
+            
+            st.markdown("**Últimos votos registrados**")
+            st.dataframe(
+                pd.DataFrame(
+                    [
+                        (datetime.fromtimestamp(e[0]).strftime('%Y-%m-%d %H:%M:%S'), *e[1:6], "remoção" if e[6] else "voto")
+                        for e in historico["ultimos"]
+                    ],
+                    columns=["Registrado em", "Problema", "Participante", "G", "U", "T", "Tipo"]
+                ),
+                use_container_width=True,
+                hide_index=True
+            )
+    
+    # Linha do tempo: ritmo de chegada dos votos e estabilidade do top 5, para decidir o encerramento
+    with st.expander("⏱️ Linha do Tempo da Votação"):
+        agora = int(time.time())
+        if not historico["eventos"]:
+            st.info("Nenhum voto registrado ainda.")
+        else:
+            janela = st.radio(
+                "Janela", ["Toda a oficina", "Última hora", "Últimos 15 minutos"],
+                horizontal=True, key="janela_linha_tempo"
+            )
+            fim = -(-agora // 10) * 10
+            inicio = {
+                "Toda a oficina": historico["primeiro"] - 1,
+                "Última hora": fim - 3600,
+                "Últimos 15 minutos": fim - 900,
+            }[janela]
+            linha_tempo = carregar_linha_do_tempo(versao, inicio, fim)
+            
+            col1, col2 = st.columns(2)
+            col1.metric("Votos nos últimos 5 minutos", votos_desde_db(agora - 300))
+            if linha_tempo["ultima_mudanca"] is None:
+                col2.metric(f"Top {TOP_K_ESTABILIDADE} estável", "toda a janela")
+            else:
+                estavel_min = max(agora - linha_tempo["ultima_mudanca"], 0) // 60
+                col2.metric(
+                    f"Top {TOP_K_ESTABILIDADE} estável há", f"{estavel_min} min",
+                    help=f"Última mudança até {datetime.fromtimestamp(linha_tempo['ultima_mudanca']):%d/%m %H:%M:%S}"
+                )
+            top_atual = [nomes[pid] for pid in linha_tempo["top"][-1].tolist() if pid in nomes]
+            if top_atual:
+                st.caption(f"Top {TOP_K_ESTABILIDADE} atual: " + " · ".join(top_atual))
+            
+            instantes = [datetime.fromtimestamp(b) for b in linha_tempo["bordas"][1:].tolist()]
+            largura = int(linha_tempo["bordas"][1] - linha_tempo["bordas"][0])
+            fig_chegadas = px.bar(
+                x=instantes, y=linha_tempo["chegadas"],
+                labels={"x": "Horário", "y": "Votos"},
+                title=f"Votos recebidos a cada {largura // 60} min" if largura >= 60 else f"Votos recebidos a cada {largura} s"
+            )
+            st.plotly_chart(fig_chegadas, use_container_width=True)
+            
+            opcoes = {nomes[pid]: i for i, pid in enumerate(linha_tempo["problemas"].tolist()) if pid in nomes}
+            selecionados = st.multiselect(
+                "Participação acumulada por problema", list(opcoes),
+                default=[nome for nome in top_atual if nome in opcoes], key="problemas_linha_tempo"
+            )
+            if selecionados:
+                colunas = [opcoes[nome] for nome in selecionados]
+                df_participacao = pd.DataFrame(
+                    linha_tempo["votantes"][:, colunas], columns=selecionados,
+                    index=[datetime.fromtimestamp(b) for b in linha_tempo["bordas"].tolist()]
+                )
+                fig_participacao = px.line(
+                    df_participacao, labels={"index": "Horário", "value": "Participantes", "variable": "Problema"},
+                    title="Participantes que já votaram em cada problema"
+                )
+                st.plotly_chart(fig_participacao, use_container_width=True)
+    
+    # Diagnóstico: nenhuma consulta frequente pode voltar a varrer a tabela de votos
+    with st.expander("🩺 Diagnóstico das Consultas (EXPLAIN QUERY PLAN)"):
+        if st.button("Verificar planos de consulta"):
+            with get_db_connection() as conn:
+                planos = verificar_planos_consultas(conn)
+            com_falha = [nome for nome, (_, falhas) in planos.items() if falhas]
+            if com_falha:
+                st.error(f"❌ Consultas com varredura completa: {', '.join(com_falha)}")
+            else:
+                st.success(f"✅ Todas as {len(planos)} consultas críticas usam índices")
+            for nome, (plano, falhas) in planos.items():
+                st.markdown(f"{'❌' if falhas else '✅'} **{nome}**")
+                st.code("\n".join(plano) or "(sem acesso a tabelas)")
+    
+    # Exportação dos votos individuais para auditoria
+    with st.expander("📤 Exportar Votos Brutos (auditoria)"):
+        formato = st.radio("Formato", list(FORMATOS_EXPORTACAO), horizontal=True, key="formato_exportacao")
+        if pq is None:
+            st.caption("Parquet disponível após instalar o pacote pyarrow.")
+        if st.button("Gerar arquivo"):
+            with st.spinner("Exportando votos..."):
+                st.session_state.exportacao_votos = exportar_votos_brutos(formato)
+        
+        if 'exportacao_votos' in st.session_state and os.path.exists(st.session_state.exportacao_votos[0]):
+            caminho, linhas = st.session_state.exportacao_votos
+            tamanho_mb = os.path.getsize(caminho) / 1024 ** 2
+            st.success(f"✅ {linhas} votos exportados para `{caminho}` ({tamanho_mb:.1f} MB)")
+            if tamanho_mb <= LIMITE_DOWNLOAD_MB:
+                extensao = caminho.rsplit(".", 1)[1]
+                mime = next(m for e, m, _ in FORMATOS_EXPORTACAO.values() if e == extensao)
+                st.download_button(
+                    "⬇️ Baixar arquivo",
+                    data=lambda: ler_arquivo(caminho),
+                    file_name=os.path.basename(caminho),
+                    mime=mime
+                )
+            else:
+                st.info(f"📁 Arquivo acima de {LIMITE_DOWNLOAD_MB} MB: copie-o direto do servidor.")
     
     st.markdown("---")
     
@@ -523,8 +2621,8 @@ elif st.session_state.modo == 'participante' and st.session_state.participante_i
         **🎯 Lembre-se**: Sua avaliação será combinada com a de outros participantes para gerar o resultado final!
         """)
     
-    # Carregar problemas do banco
-    problemas = listar_problemas_db()
+    # Carregar problemas (cache compartilhado entre participantes)
+    problemas = resultados_em_cache()["problemas"]
     
     if not problemas:
         st.warning("⚠️ Nenhum problema foi cadastrado ainda. Aguarde o administrador.")
@@ -532,64 +2630,67 @@ elif st.session_state.modo == 'participante' and st.session_state.participante_i
         st.markdown("### 📋 Avalie cada problema nos critérios G-U-T:")
         st.markdown("*💡 Dica: Leia a explicação acima se tiver dúvidas sobre os critérios*")
         
-        for i, prob in enumerate(problemas, 1):
-            # Verificar se já votou neste problema
-            voto_existente = obter_voto_participante_db(prob['id'], st.session_state.participante_id)
-            
-            # Card do problema
-            st.markdown(f"""
-            <div class="vote-card">
-                <div class="problem-title">
-                    📋 Problema {i}: {prob['nome']}
-                </div>
-                {f'<div class="problem-description">📝 {prob["descricao"]}</div>' if prob['descricao'] else ''}
-            </div>
-            """, unsafe_allow_html=True)
-            
-            with st.form(f"voto_{prob['id']}"):
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    g = st.slider(
-                        "⚠️ **Gravidade**", 
-                        1, 5, 
-                        voto_existente['gravidade'] if voto_existente else 3,
-                        key=f"g{prob['id']}",
-                        help="Quão grave é este problema? (1=Pouco grave, 5=Muito grave)"
-                    )
-                
-                with col2:
-                    u = st.slider(
-                        "⏳ **Urgência**", 
-                        1, 5, 
-                        voto_existente['urgencia'] if voto_existente else 3,
-                        key=f"u{prob['id']}",
-                        help="Quão urgente é resolver? (1=Pode esperar, 5=Urgentíssimo)"
-                    )
-                
-                with col3:
-                    t = st.slider(
-                        "📈 **Tendência**", 
-                        1, 5, 
-                        voto_existente['tendencia'] if voto_existente else 3,
-                        key=f"t{prob['id']}",
-                        help="Tendência de piorar? (1=Estável, 5=Vai piorar muito)"
-                    )
+        modo_votacao = st.radio(
+            "Modo de votação:",
+            ["📋 Todos os problemas de uma vez", "🗳️ Um problema por vez"],
+            horizontal=True,
+            help="No modo 'todos de uma vez' você avalia tudo e envia uma única vez"
+        )
+        
+        # Todos os votos do participante em uma consulta (cache da sessão)
+        votos_existentes = votos_participante_em_cache(st.session_state.participante_id)
+        
+        if modo_votacao == "📋 Todos os problemas de uma vez":
+            # Um único formulário: um envio, uma transação e um único rerun
+            st.caption(
+                "Só são enviados os problemas em que você mexeu nas notas. Para registrar um "
+                "problema ainda não votado com as notas padrão (3-3-3), marque a confirmação dele."
+            )
+            with st.form("voto_lote"):
+                votos_lote = {}
+                for i, prob in enumerate(problemas, 1):
+                    voto_existente = votos_existentes.get(prob['id'])
+                    exibir_card_problema(i, prob)
+                    notas = sliders_voto(prob, voto_existente)
+                    
+                    # Slider parado no valor inicial não é voto: sem isso quem avalia só parte
+                    # dos problemas gravaria 3-3-3 em todos os outros
+                    if voto_existente:
+                        iniciais = (voto_existente['gravidade'], voto_existente['urgencia'], voto_existente['tendencia'])
+                        confirmado = False
+                    else:
+                        iniciais = (3, 3, 3)
+                        confirmado = st.checkbox("Enviar este problema com as notas atuais", key=f"confirmar{prob['id']}")
+                    if notas != iniciais or confirmado:
+                        votos_lote[prob['id']] = notas
+                    st.markdown("---")  # Separador entre problemas
                 
-                # Preview da pontuação
-                preview_pontuacao = g * u * t
-                prioridade_preview, _ = classificar_prioridade(preview_pontuacao)
+                if st.form_submit_button("✅ Enviar Votos", type="primary"):
+                    if not votos_lote:
+                        st.warning("⚠️ Nenhuma nota foi alterada: não há votos para enviar.")
+                    elif votar_varios_problemas_db(st.session_state.participante_id, votos_lote):
+                        invalidar_votos_participante()
+                        st.success(f"✅ {len(votos_lote)} votos registrados!")
+                        st.rerun()
+        else:
+            for i, prob in enumerate(problemas, 1):
+                # Verificar se já votou neste problema
+                voto_existente = votos_existentes.get(prob['id'])
                 
-                st.info(f"**Sua pontuação**: {preview_pontuacao} | **Prioridade**: {prioridade_preview}")
+                exibir_card_problema(i, prob)
                 
-                texto_botao = "🔄 Atualizar Voto" if voto_existente else "✅ Confirmar Voto"
+                with st.form(f"voto_{prob['id']}"):
+                    g, u, t = sliders_voto(prob, voto_existente)
+                    
+                    texto_botao = "🔄 Atualizar Voto" if voto_existente else "✅ Confirmar Voto"
+                    
+                    if st.form_submit_button(texto_botao, type="primary"):
+                        if votar_problema_db(prob['id'], st.session_state.participante_id, g, u, t):
+                            invalidar_votos_participante()
+                            st.success(f"✅ Voto registrado para '{prob['nome']}'!")
+                            st.rerun()
                 
-                if st.form_submit_button(texto_botao, type="primary"):
-                    if votar_problema_db(prob['id'], st.session_state.participante_id, g, u, t):
-                        st.success(f"✅ Voto registrado para '{prob['nome']}'!")
-                        st.rerun()
-            
-            st.markdown("---")  # Separador entre problemas
+                st.markdown("---")  # Separador entre problemas
     
     # Botões de navegação
     colX, colY = st.columns(2)
@@ -617,74 +2718,27 @@ elif st.session_state.modo == 'resultados':
         if st.button("🔃 Atualizar Resultados"): 
             st.rerun()
     
-    # Carregar problemas e calcular resultados
-    problemas = listar_problemas_db()
+    # Carregar problemas e resultados (recalculados só quando os dados mudam)
+    versao = versao_dados()
+    resultados = carregar_resultados(versao)
+    problemas = resultados["problemas"]
     
     if not problemas:
         st.info("📊 Nenhum problema cadastrado ainda.")
+        aguardar_dados(versao)
     else:
-        # Calcular estatísticas completas
-        resultados_completos = []
-        dados_simples = []
+        # Estatísticas completas de todos os problemas (uma única consulta, em cache)
+        estatisticas = resultados["estatisticas"]
+        df_completo, df_simples, df_consenso = tabelas_resultados(versao)
         
-        for p in problemas:
-            stats = calcular_estatisticas_completas_db(p['id'])
-            if stats:
-                resultados_completos.append({
-                    "🏷️ Problema": p['nome'],
-                    "👥 Votos": stats['total'],
-                    
-                    # GRAVIDADE
-                    "⚠️ G (Média)": f"{stats['mg']:.1f}",
-                    "📊 G (Soma)": stats['sg'],
-                    "🎯 G (Consenso)": stats['consenso_g'],
-                    
-                    # URGÊNCIA  
-                    "⏳ U (Média)": f"{stats['mu']:.1f}",
-                    "📊 U (Soma)": stats['su'],
-                    "🎯 U (Consenso)": stats['consenso_u'],
-                    
-                    # TENDÊNCIA
-                    "📈 T (Média)": f"{stats['mt']:.1f}",
-                    "📊 T (Soma)": stats['st'],
-                    "🎯 T (Consenso)": stats['consenso_t'],
-                    
-                    # RESULTADO FINAL
-                    "🏆 Pontuação GUT": f"{stats['gut']:.1f}",
-                    "🎖️ Prioridade": classificar_prioridade(stats['gut'])[0]
-                })
-                
-                # Para gráficos
-                dados_simples.append({
-                    "Problema": p['nome'],
-                    "Total Votos": stats['total'],
-                    "Média Gravidade": stats['mg'], 
-                    "Média Urgência": stats['mu'],
-                    "Média Tendência": stats['mt'], 
-                    "Pontuação GUT": stats['gut'],
-                    "Desvio Gravidade": stats['std_g'],
-                    "Desvio Urgência": stats['std_u'],
-                    "Desvio Tendência": stats['std_t']
-                })
-        
-        if not resultados_completos:
+        if df_simples.empty:
             st.info("📊 Nenhum voto registrado ainda. Aguarde os participantes votarem.")
+            aguardar_dados(versao)
         else:
-            df_completo = pd.DataFrame(resultados_completos)
-            df_simples = pd.DataFrame(dados_simples).sort_values("Pontuação GUT", ascending=False)
-            df_simples["Prioridade"] = df_simples["Pontuação GUT"].apply(lambda x: classificar_prioridade(x)[0])
+            figuras = figuras_resultados(versao)
             
-            # Estatísticas gerais
-            stats = obter_estatisticas_db()
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("📋 Problemas", stats["problemas"])
-            with col2:
-                st.metric("🗳️ Total de Votos", stats["votos"])
-            with col3:
-                st.metric("👥 Participantes", stats["participantes"])
-            with col4:
-                st.metric("🏆 Maior Pontuação", f"{df_simples['Pontuação GUT'].max():.1f}")
+            # Estatísticas gerais (atualizam sozinhas a cada poucos segundos)
+            metricas_ao_vivo()
             
             st.markdown("---")
             
@@ -710,11 +2764,10 @@ elif st.session_state.modo == 'resultados':
                 height=400
             )
             
-            # Botão de exportação
-            csv = df_simples.to_csv(index=False)
+            # Botão de exportação (CSV gerado só no clique, uma vez por versão dos dados)
             st.download_button(
                 label="📥 Baixar Resultados Completos (CSV)",
-                data=csv,
+                data=lambda: exportar_csv_resultados(versao),
                 file_name=f"matriz_gut_dashboard_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
                 mime="text/csv"
             )
@@ -724,202 +2777,66 @@ elif st.session_state.modo == 'resultados':
             # ========== CARDS RESUMO POR PROBLEMA ==========
             st.subheader("🎯 Análise Detalhada por Problema")
             
-            for p in problemas:
-                stats = calcular_estatisticas_completas_db(p['id'])
-                if stats:
-                    prioridade, classe_css = classificar_prioridade(stats['gut'])
-                    
-                    with st.expander(f"📋 {p['nome']} - {prioridade} ({stats['gut']:.1f} pontos)"):
-                        
-                        col1, col2, col3, col4 = st.columns(4)
-                        
-                        with col1:
-                            st.metric(
-                                "👥 Total de Votos", 
-                                stats['total'],
-                                help="Número de pessoas que avaliaram este problema"
-                            )
-                        
-                        with col2:
-                            st.metric(
-                                "⚠️ Gravidade", 
-                                f"{stats['mg']:.1f}",
-                                delta=f"Soma: {stats['sg']}",
-                                help="Média das avaliações de gravidade"
-                            )
-                        
-                        with col3:
-                            st.metric(
-                                "⏳ Urgência", 
-                                f"{stats['mu']:.1f}",
-                                delta=f"Soma: {stats['su']}",
-                                help="Média das avaliações de urgência"
-                            )
-                        
-                        with col4:
-                            st.metric(
-                                "📈 Tendência", 
-                                f"{stats['mt']:.1f}",
-                                delta=f"Soma: {stats['st']}",
-                                help="Média das avaliações de tendência"
-                            )
-                        
-                        # Consenso
-                        col_cons1, col_cons2, col_cons3 = st.columns(3)
-                        with col_cons1:
-                            st.markdown(f"**Consenso G:** {formatar_consenso(stats['consenso_g'])}", unsafe_allow_html=True)
-                        with col_cons2:
-                            st.markdown(f"**Consenso U:** {formatar_consenso(stats['consenso_u'])}", unsafe_allow_html=True)
-                        with col_cons3:
-                            st.markdown(f"**Consenso T:** {formatar_consenso(stats['consenso_t'])}", unsafe_allow_html=True)
-                        
-                        # Barras de progresso visuais
-                        st.markdown("**📊 Intensidade dos Critérios:**")
-                        
-                        col_g, col_u, col_t = st.columns(3)
-                        
-                        with col_g:
-                            st.progress(stats['mg']/5, text=f"Gravidade: {stats['mg']:.1f}/5")
-                        with col_u:
-                            st.progress(stats['mu']/5, text=f"Urgência: {stats['mu']:.1f}/5")
-                        with col_t:
-                            st.progress(stats['mt']/5, text=f"Tendência: {stats['mt']:.1f}/5")
-                        
-                        # Interpretação automática
-                        st.markdown("**🤖 Interpretação Automática:**")
-                        
-                        interpretacao = []
-                        if stats['mg'] >= 4: interpretacao.append("⚠️ **Problema muito grave**")
-                        if stats['mu'] >= 4: interpretacao.append("⏰ **Requer ação imediata**") 
-                        if stats['mt'] >= 4: interpretacao.append("📈 **Vai piorar rapidamente**")
-                        if stats['consenso_g'] == "Baixo": interpretacao.append("🤔 **Divergência sobre gravidade - discutir mais**")
-                        if stats['consenso_u'] == "Baixo": interpretacao.append("🤔 **Divergência sobre urgência - discutir mais**")
-                        if stats['consenso_t'] == "Baixo": interpretacao.append("🤔 **Divergência sobre tendência - discutir mais**")
-                        
-                        if interpretacao:
-                            for item in interpretacao:
-                                st.markdown(f"- {item}")
-                        else:
-                            st.markdown("- ✅ **Problema bem avaliado e consensual**")
+            # Só os cards da página atual são montados e enviados ao navegador
+            avaliados = [p for p in problemas if p['id'] in estatisticas]
+            total_paginas = max(1, -(-len(avaliados) // CARDS_POR_PAGINA))
+            
+            pagina = 1
+            if total_paginas > 1:
+                pagina = st.number_input(
+                    f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, value=1, step=1,
+                    key="pagina_detalhes"
+                )
+            inicio = (pagina - 1) * CARDS_POR_PAGINA
+            pagina_atual = avaliados[inicio:inicio + CARDS_POR_PAGINA]
+            st.caption(f"Exibindo {inicio + 1}–{inicio + len(pagina_atual)} de {len(avaliados)} problemas")
+            
+            for p in pagina_atual:
+                stats = estatisticas[p['id']]
+                prioridade, classe_css = classificar_prioridade(stats['gut'])
+                
+                with st.expander(f"📋 {p['nome']} - {prioridade} ({stats['gut']:.1f} pontos)"):
+                    exibir_detalhe_problema(stats)
             
             st.markdown("---")
 
             # -------- VISUALIZAÇÕES AVANÇADAS --------
-            tab1, tab2, tab3, tab4, tab5 = st.tabs(["🏆 Ranking", "📊 Médias G-U-T", "🎯 Distribuição", "👥 Participação", "🎯 Análise de Consenso"])
+            tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["🏆 Ranking", "📊 Médias G-U-T", "🎯 Distribuição", "👥 Participação", "🎯 Análise de Consenso", "🧩 Mapa de Votos", "🎲 Incerteza do Ranking"])
+            aviso_top_n = (
+                f"Mostrando os {LIMITE_CATEGORIAS_GRAFICO} problemas de maior pontuação; "
+                f"os outros {len(df_simples) - LIMITE_CATEGORIAS_GRAFICO} aparecem como média em \"Outros\"."
+                if len(df_simples) > LIMITE_CATEGORIAS_GRAFICO else None
+            )
 
             with tab1:
                 st.subheader("🏆 Ranking por Pontuação GUT")
-                fig = px.bar(
-                    df_simples, 
-                    x="Pontuação GUT", 
-                    y="Problema", 
-                    orientation="h",
-                    text="Pontuação GUT",
-                    color="Pontuação GUT",
-                    color_continuous_scale=px.colors.sequential.Blues,
-                    title="Problemas ordenados por prioridade (maior pontuação = maior prioridade)"
-                )
-                fig.update_traces(texttemplate='%{text:.1f}', textposition="outside")
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
+                if aviso_top_n:
+                    st.caption(aviso_top_n)
+                ranking_ao_vivo()
 
             with tab2:
                 st.subheader("📊 Comparação dos Critérios G-U-T")
-                dfm = df_simples.melt(
-                    id_vars="Problema",
-                    value_vars=["Média Gravidade", "Média Urgência", "Média Tendência"],
-                    var_name="Critério",
-                    value_name="Média"
-                )
-                dfm['Critério'] = dfm['Critério'].str.replace("Média ", "")
-                
-                figm = px.bar(
-                    dfm, 
-                    x="Problema", 
-                    y="Média", 
-                    color="Critério", 
-                    barmode="group",
-                    text="Média",
-                    color_discrete_map={
-                        "Gravidade": "#1f77b4",
-                        "Urgência": "#2ca02c", 
-                        "Tendência": "#ff7f0e"
-                    },
-                    title="Médias por critério para cada problema"
-                )
-                figm.update_traces(texttemplate='%{text:.2f}', textposition="outside")
-                figm.update_layout(height=400)
-                st.plotly_chart(figm, use_container_width=True)
+                if aviso_top_n:
+                    st.caption(aviso_top_n)
+                st.plotly_chart(figuras["medias"], use_container_width=True)
 
             with tab3:
                 st.subheader("🎯 Distribuição das Pontuações")
-                figh = px.histogram(
-                    df_simples, 
-                    x="Pontuação GUT", 
-                    nbins=10, 
-                    text_auto=True,
-                    color_discrete_sequence=["#1f77b4"],
-                    title="Distribuição das pontuações GUT"
-                )
-                figh.update_layout(height=400)
-                st.plotly_chart(figh, use_container_width=True)
+                st.plotly_chart(figuras["distribuicao"], use_container_width=True)
+                st.plotly_chart(figuras["notas"], use_container_width=True)
 
             with tab4:
                 st.subheader("👥 Participação por Problema")
-                figp = px.bar(
-                    df_simples, 
-                    x="Problema", 
-                    y="Total Votos", 
-                    text="Total Votos",
-                    color_discrete_sequence=["#2ca02c"],
-                    title="Número de votos recebidos por cada problema"
-                )
-                figp.update_traces(texttemplate='%{text}', textposition="outside")
-                figp.update_layout(height=400)
-                st.plotly_chart(figp, use_container_width=True)
+                if aviso_top_n:
+                    st.caption(aviso_top_n)
+                st.plotly_chart(figuras["participacao"], use_container_width=True)
 
             with tab5:
                 st.subheader("🎯 Análise de Consenso")
                 
                 # Gráfico de dispersão dos desvios
-                dados_consenso = []
-                for p in problemas:
-                    stats = calcular_estatisticas_completas_db(p['id'])
-                    if stats:
-                        nome_curto = p['nome'][:20] + "..." if len(p['nome']) > 20 else p['nome']
-                        dados_consenso.append({
-                            "Problema": nome_curto,
-                            "Desvio Gravidade": stats['std_g'],
-                            "Desvio Urgência": stats['std_u'], 
-                            "Desvio Tendência": stats['std_t'],
-                            "Pontuação GUT": stats['gut']
-                        })
-                
-                if dados_consenso:
-                    df_consenso = pd.DataFrame(dados_consenso)
-                    
-                    fig_consenso = px.scatter(
-                        df_consenso,
-                        x="Desvio Gravidade",
-                        y="Desvio Urgência", 
-                        size="Pontuação GUT",
-                        color="Desvio Tendência",
-                        hover_name="Problema",
-                        title="Consenso vs Divergência (menor desvio = maior consenso)",
-                        labels={
-                            "Desvio Gravidade": "Divergência na Gravidade",
-                            "Desvio Urgência": "Divergência na Urgência"
-                        }
-                    )
-                    
-                    fig_consenso.add_hline(y=0.8, line_dash="dash", line_color="green", 
-                                          annotation_text="Limite consenso alto")
-                    fig_consenso.add_vline(x=0.8, line_dash="dash", line_color="green")
-                    fig_consenso.add_hline(y=1.5, line_dash="dash", line_color="orange", 
-                                          annotation_text="Limite consenso médio")
-                    fig_consenso.add_vline(x=1.5, line_dash="dash", line_color="orange")
-                    
-                    st.plotly_chart(fig_consenso, use_container_width=True)
+                if not df_consenso.empty:
+                    st.plotly_chart(figuras["consenso"], use_container_width=True)
                     
                     st.markdown("""
                     **💡 Como interpretar o gráfico de consenso:**
@@ -944,6 +2861,14 @@ elif st.session_state.modo == 'resultados':
                         use_container_width=True
                     )
 
+            with tab6:
+                st.subheader("🧩 Mapa de Votos por Participante")
+                exibir_mapa_votos(versao)
+            
+            with tab7:
+                st.subheader("🎲 Incerteza do Ranking")
+                exibir_incerteza_ranking(versao)
+
 # ========== FALLBACK ==========
 else:
     st.error("❌ Estado inválido. Retornando ao início...")
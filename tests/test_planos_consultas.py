@@ -0,0 +1,40 @@
+"""Consultas quentes não podem voltar a varrer as tabelas de votos (ver CONSULTAS_CRITICAS)."""
+import sqlite3
+
+import pytest
+
+from banco_gut import (
+    CONSULTAS_CRITICAS, MIGRACOES, PRAGMAS_CONEXAO, aplicar_migracoes, verificar_planos_consultas,
+)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "matriz_gut.db")
+    for pragma in PRAGMAS_CONEXAO:
+        conn.execute(pragma)
+    aplicar_migracoes(conn)
+    yield conn
+    conn.close()
+
+
+def test_migracoes_levam_banco_vazio_a_ultima_versao(conn):
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRACOES)
+    # Reaplicar não faz nada
+    aplicar_migracoes(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRACOES)
+
+
+@pytest.mark.parametrize("nome", sorted(CONSULTAS_CRITICAS))
+def test_consulta_critica_usa_indices(conn, nome):
+    plano, falhas = verificar_planos_consultas(conn)[nome]
+    assert not falhas, f"{nome} caiu em varredura ou ordenação temporária:\n" + "\n".join(plano)
+
+
+@pytest.mark.parametrize("nome", ["linha_do_tempo", "votos_desde"])
+def test_varredura_sem_indice_e_detectada(conn, nome):
+    # Sem o índice por criado_em as duas varrem eventos_votos; a linha do tempo aparece
+    # no plano pelo apelido ("SCAN e")
+    conn.execute("DROP INDEX idx_eventos_votos_criado_em")
+    plano, falhas = verificar_planos_consultas(conn)[nome]
+    assert falhas, "varredura não detectada:\n" + "\n".join(plano)